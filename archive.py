@@ -0,0 +1,255 @@
+import argparse
+import io
+import os
+import struct
+import sys
+import tarfile
+import time
+import zipfile
+
+# Archive sinks for batch output: encoded signatures are appended to one file
+# instead of creating one file per signature. Sinks take (key, bytes) from a
+# single writer; keys are the rows' output paths.
+#
+#   ZipSink   - .zip, entries stored uncompressed (PNGs are already deflated)
+#   TarSink   - .tar, .tar.gz / .tgz
+#   PackSink  - .pack, an append-only file with an offset index, read back
+#               with PackReader without scanning the file
+#
+# Pack layout (little-endian):
+#   b"SIGPACK1"
+#   records:  <H key length> <I data length> key data
+#   index:    <H key length> <Q offset of data> <I data length> key   (per key)
+#   footer:   <Q index offset> <I entry count> b"SIGPKIDX"
+# The index is rewritten at the end on every close; a pack whose writer died
+# before that is recovered by scanning its records once.
+
+PACK_MAGIC = b"SIGPACK1"
+PACK_FOOTER_MAGIC = b"SIGPKIDX"
+_RECORD = struct.Struct("<HI")
+_INDEX_ENTRY = struct.Struct("<HQI")
+_FOOTER = struct.Struct("<QI8s")
+
+
+class ZipSink:
+    def __init__(self, path):
+        self.path = path
+        self._zip = zipfile.ZipFile(path, "w", zipfile.ZIP_STORED)
+        self._date = time.localtime()[:6]
+
+    def write(self, key, data):
+        info = zipfile.ZipInfo(key, self._date)
+        info.external_attr = 0o644 << 16
+        self._zip.writestr(info, data)
+
+    def close(self):
+        self._zip.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+class TarSink:
+    def __init__(self, path):
+        self.path = path
+        mode = "w:gz" if path.lower().endswith((".tar.gz", ".tgz")) else "w"
+        self._tar = tarfile.open(path, mode)
+        self._mtime = time.time()
+
+    def write(self, key, data):
+        info = tarfile.TarInfo(key)
+        info.size = len(data)
+        info.mtime = self._mtime
+        info.mode = 0o644
+        self._tar.addfile(info, io.BytesIO(data))
+
+    def close(self):
+        self._tar.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+def _read_pack_index(f):
+    # {key: (offset, length)} and the end of the last record. Uses the footer
+    # index when present, otherwise scans the records (e.g. after a crash).
+    size = f.seek(0, os.SEEK_END)
+    f.seek(0)
+    if f.read(len(PACK_MAGIC)) != PACK_MAGIC:
+        raise ValueError("not a signature pack")
+    if size >= len(PACK_MAGIC) + _FOOTER.size:
+        f.seek(size - _FOOTER.size)
+        index_offset, count, magic = _FOOTER.unpack(f.read(_FOOTER.size))
+        if magic == PACK_FOOTER_MAGIC and index_offset <= size - _FOOTER.size:
+            f.seek(index_offset)
+            blob = f.read(size - _FOOTER.size - index_offset)
+            index = {}
+            pos = 0
+            for _ in range(count):
+                key_length, offset, length = _INDEX_ENTRY.unpack_from(blob, pos)
+                pos += _INDEX_ENTRY.size
+                index[blob[pos:pos + key_length].decode("utf-8")] = (offset, length)
+                pos += key_length
+            return index, index_offset
+
+    index = {}
+    end = len(PACK_MAGIC)
+    f.seek(end)
+    while True:
+        header = f.read(_RECORD.size)
+        if len(header) < _RECORD.size:
+            break
+        key_length, length = _RECORD.unpack(header)
+        key = f.read(key_length)
+        offset = end + _RECORD.size + key_length
+        if len(key) < key_length or offset + length > size:
+            break  # torn final record
+        index[key.decode("utf-8")] = (offset, length)
+        end = f.seek(offset + length)
+    return index, end
+
+
+class PackSink:
+    def __init__(self, path):
+        # Appends to an existing pack; later writes of a key replace earlier ones
+        self.path = path
+        if os.path.exists(path) and os.path.getsize(path):
+            self._file = open(path, "r+b")
+            self._index, end = _read_pack_index(self._file)
+            self._file.truncate(end)
+            self._file.seek(end)
+        else:
+            self._file = open(path, "w+b")
+            self._file.write(PACK_MAGIC)
+            self._index = {}
+
+    def write(self, key, data):
+        encoded = key.encode("utf-8")
+        self._file.write(_RECORD.pack(len(encoded), len(data)) + encoded)
+        self._index[key] = (self._file.tell(), len(data))
+        self._file.write(data)
+
+    def __contains__(self, key):
+        return key in self._index
+
+    def length(self, key):
+        # Size of the record stored under `key`, or None
+        entry = self._index.get(key)
+        return entry[1] if entry else None
+
+    def get(self, key, default=None):
+        # Reads back a record from this session or an earlier one
+        entry = self._index.get(key)
+        if entry is None:
+            return default
+        end = self._file.tell()
+        self._file.seek(entry[0])
+        data = self._file.read(entry[1])
+        self._file.seek(end)
+        return data
+
+    def close(self):
+        if self._file.closed:
+            return
+        index_offset = self._file.tell()
+        parts = []
+        for key, (offset, length) in self._index.items():
+            encoded = key.encode("utf-8")
+            parts.append(_INDEX_ENTRY.pack(len(encoded), offset, length) + encoded)
+        self._file.write(b"".join(parts))
+        self._file.write(_FOOTER.pack(index_offset, len(self._index), PACK_FOOTER_MAGIC))
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+class PackReader:
+    # Random access by key: the index is read once, every get() is one seek + read
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "rb")
+        self._index, _ = _read_pack_index(self._file)
+
+    def get(self, key, default=None):
+        entry = self._index.get(key)
+        if entry is None:
+            return default
+        self._file.seek(entry[0])
+        return self._file.read(entry[1])
+
+    def __getitem__(self, key):
+        data = self.get(key)
+        if data is None:
+            raise KeyError(key)
+        return data
+
+    def __contains__(self, key):
+        return key in self._index
+
+    def __len__(self):
+        return len(self._index)
+
+    def keys(self):
+        return self._index.keys()
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+def open_sink(path):
+    lower = path.lower()
+    if lower.endswith(".zip"):
+        return ZipSink(path)
+    if lower.endswith((".tar", ".tar.gz", ".tgz")):
+        return TarSink(path)
+    if lower.endswith(".pack"):
+        return PackSink(path)
+    raise ValueError(f"unsupported archive type: {path} (use .zip, .tar, .tar.gz or .pack)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="List or extract signatures from a .pack file.")
+    parser.add_argument("pack")
+    parser.add_argument("key", nargs="?", help="signature to extract (default: list all keys)")
+    parser.add_argument("-o", "--output", help="write the signature here instead of stdout")
+    args = parser.parse_args(argv)
+
+    with PackReader(args.pack) as reader:
+        if args.key is None:
+            for key in reader.keys():
+                print(key)
+            return 0
+        data = reader.get(args.key)
+        if data is None:
+            print(f"{args.key}: not in {args.pack}", file=sys.stderr)
+            return 1
+        if args.output:
+            with open(args.output, "wb") as f:
+                f.write(data)
+        else:
+            sys.stdout.buffer.write(data)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
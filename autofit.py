@@ -0,0 +1,112 @@
+from effects import effect_extent
+from renderer import CANVAS_SIZE, make_spec, render_font
+
+# Auto-fit: the largest font size at which a name, including its effects,
+# fits the canvas with margins. Text extents are measured once at
+# REFERENCE_SIZE and scaled linearly to estimate the size; a short binary
+# search with real bounding boxes around the estimate then verifies it.
+# Probes measure with font.getbbox and build no glyph atlas, so a fit only
+# costs a font load (usually cached) and a layout per probed size.
+
+REFERENCE_SIZE = 100
+MIN_SIZE = 30
+MAX_SIZE = 150
+MARGIN = 20
+
+# Hinting makes extents scale slightly non-linearly, and even non-monotonically
+# (a size can fit while one or two below it don't); the search window around
+# the estimate covers the former, and a fit is only final once none of the
+# STEP_WINDOW sizes above it fits
+SEARCH_WINDOW = 2
+STEP_WINDOW = 4
+
+
+def _fits(bbox, canvas, extent, margin):
+    # Same placement as render_signature: the box size is centered and the ink
+    # lands at that position plus the box's own offset
+    left, top, right, bottom = bbox
+    for offset, length, room, before, after in ((left, right - left, canvas[0], extent[0], extent[2]),
+                                                (top, bottom - top, canvas[1], extent[1], extent[3])):
+        start = (room - length) // 2 + offset
+        if start - before < margin or start + length + after > room - margin:
+            return False
+    return True
+
+
+class _Fitter:
+    def __init__(self, font, canvas, effects, margin, min_size, max_size, axes=()):
+        # Measures with the font the renderer will use, e.g. the heavier
+        # instance for bold on a variable font
+        self.spec = make_spec("", font, REFERENCE_SIZE, canvas=canvas, effects=effects, axes=axes)
+        self.canvas = self.spec.canvas
+        reference, effects = render_font(self.spec)
+        self.extent = effect_extent(effects)
+        self.margin = margin
+        self.min_size = min_size
+        self.max_size = max_size
+        self.reference = reference
+
+    def fits(self, name, size):
+        font, _ = render_font(self.spec._replace(size=size))
+        return _fits(font.getbbox(name), self.canvas, self.extent, self.margin)
+
+    def estimate(self, name):
+        # Solve the placement inequalities of _fits with every extent scaled
+        # linearly from the reference size
+        left, top, right, bottom = self.reference.getbbox(name)
+        scale = self.max_size / REFERENCE_SIZE
+        for offset, length, room, before, after in ((left, right - left, self.canvas[0], self.extent[0], self.extent[2]),
+                                                    (top, bottom - top, self.canvas[1], self.extent[1], self.extent[3])):
+            half = room / 2 - self.margin
+            # Ink spans [-length/2 + offset, length/2 + offset] around the center
+            for reach, pad in ((length / 2 - offset, before), (length / 2 + offset, after)):
+                if reach > 0:
+                    scale = min(scale, (half - pad) / reach)
+        return int(REFERENCE_SIZE * scale)
+
+    def fit(self, name, guess=None):
+        if guess is None:
+            guess = self.estimate(name)
+        guess = min(max(guess, self.min_size), self.max_size)
+        lo = max(self.min_size, guess - SEARCH_WINDOW)
+        hi = min(self.max_size, guess + SEARCH_WINDOW)
+        # Widen the window in the rare case the estimate is far off
+        while lo > self.min_size and not self.fits(name, lo):
+            hi, lo = lo - 1, max(self.min_size, lo - 4 * SEARCH_WINDOW)
+        if lo == self.min_size and not self.fits(name, lo):
+            return self.min_size
+        while hi < self.max_size and self.fits(name, hi):
+            lo, hi = hi, min(self.max_size, hi + 4 * SEARCH_WINDOW)
+        # lo fits; find the largest fitting size in (lo, hi]
+        while lo < hi:
+            mid = (lo + hi + 1) // 2
+            if self.fits(name, mid):
+                lo = mid
+            else:
+                hi = mid - 1
+        # The search only brackets a fit/no-fit boundary; step past sizes
+        # that fit again just above it
+        while True:
+            above = next((size for size in range(lo + 1, min(self.max_size, lo + STEP_WINDOW) + 1)
+                          if self.fits(name, size)), None)
+            if above is None:
+                return lo
+            lo = above
+
+
+def fit_size(name, font, canvas=CANVAS_SIZE, effects=(), margin=MARGIN, min_size=MIN_SIZE, max_size=MAX_SIZE,
+             axes=()):
+    return _Fitter(font, canvas, effects, margin, min_size, max_size, axes).fit(name)
+
+
+def fit_sizes(names, font, canvas=CANVAS_SIZE, effects=(), margin=MARGIN, min_size=MIN_SIZE, max_size=MAX_SIZE,
+              axes=()):
+    # Batch version: the reference font and effect extents are shared by all
+    # names, and names are verified in order of their estimate so that nearby
+    # sizes stay in the font cache
+    fitter = _Fitter(font, canvas, effects, margin, min_size, max_size, axes)
+    estimates = [fitter.estimate(name) for name in names]
+    sizes = [None] * len(estimates)
+    for i in sorted(range(len(estimates)), key=estimates.__getitem__):
+        sizes[i] = fitter.fit(names[i], estimates[i])
+    return sizes
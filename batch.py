@@ -0,0 +1,440 @@
+import argparse
+import csv
+import json
+import os
+import shutil
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from collections import namedtuple
+from functools import partial
+from itertools import islice
+from archive import open_sink
+from autofit import fit_sizes
+from effects import available_effects
+from export import encode_compact
+from fontregistry import resolve_font
+from instrument import StageStats, TraceRecorder, emit, instrumented, timed
+from manifest import Manifest, checksum, file_checksum, spec_hash
+from render_cache import encode_png, font_digest
+from renderer import DEFAULT_FONT, make_spec, preload_fonts, render_signature
+from workerpool import WarmPool, format_worker_stats, mark_result, tree_memory, warm_render_path
+
+# Batch signature generation: stream rows from CSV or JSONL and render them on
+# a process pool. Rows carry name, font (a FONT_PATHS key or the name
+# of any font in the registry, see fontregistry.py), size, color,
+# background, effects, weight or axes (variable fonts) and output; only name
+# and output are required. A size
+# of "auto" (or --auto-fit for rows without a size) fits the name to the canvas.
+# Outputs ending in .svg or .pdf are written as vectors (needs fontTools).
+# With --archive, workers return the encoded bytes and the main process
+# appends them to a single ZIP, tar or .pack file keyed by the output path.
+#
+#   python batch.py employees.csv --workers 8 --output-dir out/
+#   python batch.py employees.csv --archive signatures.pack
+#   python batch.py employees.csv --output-dir out/ --manifest out/manifest.db
+#
+# With --manifest, only rows whose spec or font changed since the last run
+# are rendered, and rows with identical specs are rendered once and copied.
+#
+# --warm-pool forks the workers from a process that has already loaded the
+# fonts and rendered once (see workerpool.py) and can recycle them with
+# --max-tasks-per-child (counted in chunks).
+#
+# For large batches, --memory-limit caps the whole process tree: reading
+# pauses while it is over the limit, and an idle pool over the limit is
+# restarted once. bench.py memory shows the peak staying flat as rows grow.
+#
+#   python batch.py employees.csv --output-dir out/ --memory-limit 512
+
+
+def read_rows(path, fmt=None):
+    # Yields (row_number, dict) lazily so the input is never loaded whole
+    fmt = fmt or ("jsonl" if path.endswith((".jsonl", ".ndjson")) else "csv")
+    with open(path, newline="", encoding="utf-8") as f:
+        if fmt == "csv":
+            for number, row in enumerate(csv.DictReader(f), start=2):
+                yield number, row
+        else:
+            for number, line in enumerate(f, start=1):
+                if line.strip():
+                    try:
+                        yield number, json.loads(line)
+                    except ValueError as e:
+                        yield number, {"_error": f"invalid JSON: {e}"}
+
+
+def parse_effects(value):
+    if not value:
+        return []
+    if isinstance(value, str):
+        value = value.replace(";", " ").replace("|", " ").replace(",", " ").split()
+    effects = [e.strip().lower() for e in value]
+    unknown = [e for e in effects if e not in available_effects()]
+    if unknown:
+        raise ValueError(f"unknown effect(s): {', '.join(unknown)}")
+    return effects
+
+
+def parse_axes(value, weight=None):
+    # "wght=600;wdth=90" (or a dict from JSON) into {tag: value}; `weight` is
+    # shorthand for wght
+    if isinstance(value, dict):
+        axes = dict(value)
+    else:
+        axes = {}
+        for item in (value or "").replace(";", " ").replace(",", " ").split():
+            tag, sep, number = item.partition("=")
+            if not sep:
+                raise ValueError(f"bad axis setting: {item} (expected tag=value)")
+            axes[tag.strip()] = number
+    if weight not in (None, ""):
+        axes["wght"] = weight
+    try:
+        return {tag: float(number) for tag, number in axes.items()}
+    except (TypeError, ValueError):
+        raise ValueError(f"bad axis value in: {value or weight}")
+
+
+# Per-run settings shipped to the workers with every chunk
+BatchOptions = namedtuple("BatchOptions", ["output_dir", "atlas", "auto_fit", "compact", "trace", "archive",
+                                          "manifest"],
+                          defaults=[".", False, False, False, False, False, False])
+
+
+def row_to_job(row, output_dir=".", auto_fit=False):
+    # Returns (spec, output path, whether the size should be auto-fitted)
+    if "_error" in row:
+        raise ValueError(row["_error"])
+    name = (row.get("name") or "").strip()
+    if not name:
+        raise ValueError("missing name")
+    output = row.get("output")
+    if not output:
+        raise ValueError("missing output")
+    font = resolve_font(row.get("font") or DEFAULT_FONT)
+    effects = parse_effects(row.get("effects"))
+    size = str(row.get("size") or ("auto" if auto_fit else 80)).strip().lower()
+    fit = size == "auto"
+    axes = parse_axes(row.get("axes"), row.get("weight"))
+    spec = make_spec(name, font, 80 if fit else size, row.get("color") or "#000000",
+                     row.get("background") or "White", effects=effects, axes=axes)
+    return spec, os.path.join(output_dir, output), fit
+
+
+def _init_worker(sizes):
+    # Parse every font once per worker instead of once per row
+    preload_fonts(sizes)
+
+
+def _fit_jobs(jobs):
+    # Auto-fit sizes with one fit_sizes call per (font, effects, canvas, axes) group
+    groups = {}
+    for i, (number, spec, output, fit) in enumerate(jobs):
+        if fit:
+            groups.setdefault((spec.font, spec.effects, spec.canvas, spec.axes), []).append(i)
+    for (font, effects, canvas, axes), indexes in groups.items():
+        sizes = fit_sizes([jobs[i][1].name for i in indexes], font, canvas, effects, axes=axes)
+        for i, size in zip(indexes, sizes):
+            number, spec, output, _ = jobs[i]
+            jobs[i] = (number, spec._replace(size=size), output, False)
+
+
+def _encode(spec, output, options):
+    if output.lower().endswith((".svg", ".pdf")):
+        from vector import vector_data
+        with timed("vector"):
+            return vector_data(spec, output)
+    img = render_signature(spec, atlas=options.atlas)
+    return encode_compact(img) if options.compact else encode_png(img)
+
+
+def output_key(output):
+    return os.path.normpath(output).replace(os.sep, "/")
+
+
+def _render_chunk(chunk, options):
+    # Returns per-row results plus the stage events recorded with options.trace.
+    # A result is (row number, error or None, (key, encoded bytes) with
+    # options.archive, (checksum, size) of the output with options.manifest)
+    if not options.trace:
+        return _render_rows(chunk, options), []
+    with instrumented(TraceRecorder()) as recorder:
+        results = _render_rows(chunk, options)
+    return results, recorder.events
+
+
+def _render_rows(chunk, options):
+    results = []
+    jobs = []
+    for number, row in chunk:
+        try:
+            jobs.append((number,) + row_to_job(row, options.output_dir, options.auto_fit))
+        except Exception as e:
+            results.append((number, f"{type(e).__name__}: {e}", None, None))
+    _fit_jobs(jobs)
+
+    for number, spec, output, _ in jobs:
+        try:
+            if options.archive:
+                data = _encode(spec, output, options)
+                digest = (checksum(data), len(data)) if options.manifest else None
+                results.append((number, None, (output_key(output), data), digest))
+                continue
+            os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+            if options.compact or output.lower().endswith((".svg", ".pdf")):
+                data = _encode(spec, output, options)
+                with timed("write") as span, open(output, "wb") as f:
+                    f.write(data)
+                    span.add_bytes(len(data))
+            else:
+                img = render_signature(spec, atlas=options.atlas)
+                with timed("save"):
+                    img.save(output)
+            digest = (file_checksum(output), os.path.getsize(output)) if options.manifest else None
+            results.append((number, None, None, digest))
+        except Exception as e:
+            results.append((number, f"{type(e).__name__}: {e}", None, None))
+        finally:
+            mark_result()
+    return results
+
+
+def run_batch(rows, options=BatchOptions(), workers=None, chunk_size=64, max_pending=None,
+              preload_sizes=(80,), on_failure=None, sink=None, warm_pool=False, max_tasks_per_child=None,
+              manifest=None, memory_limit=None):
+    # At most `max_pending` chunks are queued or running at once; reading the
+    # input waits for a chunk to finish, which keeps memory flat. Stage events
+    # recorded by the workers (options.trace) are passed to this process's hooks.
+    # With a `sink` (see archive.py) this process is its only writer. With
+    # `warm_pool`, stats["workers"] has per-worker task times and memory.
+    # With a `manifest` (see manifest.py), rows whose spec and font match the
+    # last run are skipped ("unchanged") and rows with the same spec as an
+    # output already written are copied from it ("reused"). With
+    # `memory_limit` (bytes of PSS for this process and its workers), no
+    # chunk is submitted while the tree is over it; stats["peak_memory"] is
+    # the highest PSS sampled.
+    if manifest is not None and sink is not None and not hasattr(sink, "get"):
+        raise ValueError("a manifest needs per-file output or a .pack archive (zip and tar are rewritten every run)")
+    options = options._replace(archive=sink is not None, manifest=manifest is not None)
+    workers = workers or os.cpu_count() or 1
+    max_pending = max_pending or workers * 2
+    stats = {"rendered": 0, "failed": 0}
+    if manifest is not None:
+        stats.update(unchanged=0, reused=0)
+    if memory_limit is not None:
+        stats.update(peak_memory=0, memory_waits=0, restarts=0)
+    start = time.perf_counter()
+    planned = {}   # row number -> (key, output, hashes) while its chunk is pending
+    waiting = {}   # hashes -> [(number, key, output)] duplicates of a pending row
+
+    def fail(number, error):
+        stats["failed"] += 1
+        if on_failure:
+            on_failure(number, error)
+
+    def present(key, size):
+        # Whether the output recorded in the manifest is still there
+        if sink is not None:
+            return sink.length(key) == size
+        try:
+            return os.path.getsize(key) == size
+        except OSError:
+            return False
+
+    def reuse(source, data, key, output, hashes, digest):
+        # Copies an identical output: `data` for archives, the file `source` otherwise
+        with timed("reuse"):
+            if sink is not None:
+                sink.write(key, data if data is not None else sink.get(source))
+            else:
+                os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+                shutil.copyfile(source, output)
+        manifest.put(key, *hashes, *digest)
+        stats["reused"] += 1
+
+    def plan(rows):
+        # Settles unchanged and duplicate rows here; yields the rest for rendering
+        for number, row in rows:
+            try:
+                spec, output, fit = row_to_job(row, options.output_dir, options.auto_fit)
+                key = output_key(output)
+                hashes = (spec_hash(spec, fit=fit, compact=options.compact, atlas=options.atlas,
+                                    archive=options.archive, format=os.path.splitext(output)[1].lower()),
+                          font_digest(spec.font))
+            except Exception as e:
+                fail(number, f"{type(e).__name__}: {e}")
+                continue
+            entry = manifest.get(key)
+            if entry is not None and entry[:2] == hashes and present(key, entry[3]):
+                stats["unchanged"] += 1
+                continue
+            if hashes in waiting:
+                waiting[hashes].append((number, key, output))
+                continue
+            source = next(((k, c, n) for k, c, n in manifest.find(*hashes) if present(k, n)), None)
+            if source is not None:
+                reuse(source[0], None, key, output, hashes, source[1:])
+                continue
+            waiting[hashes] = []
+            planned[number] = (key, output, hashes)
+            # The old output is about to be overwritten: keep it from being
+            # picked as a copy source until the new one is recorded
+            manifest.forget(key)
+            yield number, row
+
+    def collect(done):
+        for future in done:
+            results, events = future.result()
+            for event in events:
+                emit(event)
+            for number, error, payload, digest in results:
+                if error is None and payload is not None:
+                    with timed("archive") as span:
+                        sink.write(*payload)
+                        span.add_bytes(len(payload[1]))
+                if error is None:
+                    stats["rendered"] += 1
+                else:
+                    fail(number, error)
+                if manifest is None:
+                    continue
+                key, output, hashes = planned.pop(number)
+                duplicates = waiting.pop(hashes)
+                if error is not None:
+                    for duplicate, _, _ in duplicates:
+                        fail(duplicate, error)
+                    continue
+                manifest.put(key, *hashes, *digest)
+                for duplicate, duplicate_key, duplicate_output in duplicates:
+                    try:
+                        reuse(key, payload and payload[1], duplicate_key, duplicate_output, hashes, digest)
+                    except OSError as e:
+                        fail(duplicate, f"{type(e).__name__}: {e}")
+            if manifest is not None:
+                manifest.commit()
+
+    def new_pool():
+        if warm_pool:
+            return WarmPool(workers, max_tasks_per_child, warm=partial(warm_render_path, tuple(preload_sizes)))
+        return ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(tuple(preload_sizes),))
+
+    restartable = True  # whether the tree has been under the limit since the last restart
+
+    def over_limit():
+        nonlocal restartable
+        memory = tree_memory()
+        if memory is None:
+            return False
+        stats["peak_memory"] = max(stats["peak_memory"], memory["pss"])
+        if memory["pss"] <= memory_limit:
+            restartable = True
+        return memory["pss"] > memory_limit
+
+    rows = iter(rows) if manifest is None else plan(rows)
+    pending = set()
+    pool = new_pool()
+    submitted = 0  # chunks since the pool was (re)started
+    try:
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                break
+            if len(pending) >= max_pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                collect(done)
+            if memory_limit is not None:
+                while pending and over_limit():
+                    stats["memory_waits"] += 1
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    collect(done)
+                if not pending and submitted and restartable and over_limit():
+                    # Idle and still over: the workers' heaps have grown, and
+                    # fresh ones start from the preloaded baseline. If that is
+                    # over the limit too, chunks just run one at a time.
+                    pool.shutdown()
+                    pool, submitted, restartable = new_pool(), 0, False
+                    stats["restarts"] += 1
+            pending.add(pool.submit(_render_chunk, chunk, options))
+            submitted += 1
+        done, _ = wait(pending)
+        collect(done)
+        if memory_limit is not None:
+            over_limit()
+        if warm_pool:
+            stats["workers"] = pool.worker_stats()
+    finally:
+        pool.shutdown()
+    if manifest is not None:
+        manifest.commit()
+
+    stats["seconds"] = time.perf_counter() - start
+    total = sum(stats[k] for k in ("rendered", "failed", "unchanged", "reused") if k in stats)
+    stats["per_second"] = total / stats["seconds"] if stats["seconds"] else 0.0
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate signatures in bulk from a CSV or JSONL file.")
+    parser.add_argument("input", help="CSV or JSONL file with one signature per row")
+    parser.add_argument("--format", choices=["csv", "jsonl"], help="input format (default: from extension)")
+    parser.add_argument("--output-dir", default=".", help="directory for relative output paths")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--chunk-size", type=int, default=64, help="rows per worker task")
+    parser.add_argument("--max-pending", type=int, default=None, help="chunks in flight before reading pauses")
+    parser.add_argument("--preload-sizes", type=int, nargs="+", default=[80], help="font sizes to load in each worker")
+    parser.add_argument("--atlas", action="store_true", help="compose text from cached glyph masks")
+    parser.add_argument("--auto-fit", action="store_true", help="fit rows without a size to the canvas")
+    parser.add_argument("--compact", action="store_true", help="write PNGs cropped to the ink in the smallest exact mode")
+    parser.add_argument("--archive", metavar="PATH",
+                        help="write all signatures into one .zip, .tar(.gz) or .pack file, keyed by output path")
+    parser.add_argument("--trace", metavar="PATH",
+                        help="record per-stage timings, print a summary and write a Chrome trace to PATH")
+    parser.add_argument("--warm-pool", action="store_true",
+                        help="fork workers from a process with the fonts already loaded; prints per-worker stats")
+    parser.add_argument("--max-tasks-per-child", type=int, default=None, metavar="N",
+                        help="with --warm-pool, replace each worker after N chunks")
+    parser.add_argument("--manifest", metavar="PATH",
+                        help="SQLite manifest of spec/font hashes; re-render only rows that changed since the last run")
+    parser.add_argument("--memory-limit", type=float, default=None, metavar="MB",
+                        help="pause reading while this process and its workers use more than MB (PSS, Linux)")
+    args = parser.parse_args(argv)
+    if args.max_tasks_per_child and not args.warm_pool:
+        parser.error("--max-tasks-per-child requires --warm-pool")
+
+    def report_failure(number, error):
+        print(f"row {number}: {error}", file=sys.stderr)
+
+    options = BatchOptions(args.output_dir, args.atlas, args.auto_fit, args.compact, bool(args.trace))
+    stage_stats, recorder = StageStats(), TraceRecorder()
+    if args.manifest and args.archive and not args.archive.lower().endswith(".pack"):
+        parser.error("--manifest works with per-file output or a .pack archive")
+    sink = open_sink(args.archive) if args.archive else None
+    manifest = Manifest(args.manifest) if args.manifest else None
+    try:
+        with instrumented(*((stage_stats, recorder) if args.trace else ())):
+            stats = run_batch(read_rows(args.input, args.format), options, args.workers,
+                              args.chunk_size, args.max_pending, args.preload_sizes, report_failure, sink,
+                              args.warm_pool, args.max_tasks_per_child, manifest,
+                              args.memory_limit and int(args.memory_limit * (1 << 20)))
+    finally:
+        if sink is not None:
+            sink.close()
+        if manifest is not None:
+            manifest.close()
+    if args.trace:
+        recorder.dump(args.trace)
+        print(stage_stats.report(), file=sys.stderr)
+    if args.warm_pool:
+        print(format_worker_stats(stats["workers"]), file=sys.stderr)
+    if args.memory_limit:
+        print(f"Peak memory {stats['peak_memory'] / (1 << 20):.1f} MiB PSS (limit {args.memory_limit:g}), "
+              f"{stats['memory_waits']} waits, {stats['restarts']} pool restarts", file=sys.stderr)
+    skipped = f"{stats['unchanged']} unchanged, {stats['reused']} reused, " if manifest is not None else ""
+    print(f"Rendered {stats['rendered']} signatures, {skipped}{stats['failed']} failed "
+          f"in {stats['seconds']:.2f}s ({stats['per_second']:.1f} signatures/sec)")
+    return 1 if stats["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,387 @@
+import argparse
+import gc
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from itertools import product
+import PIL
+from render_cache import encode_png
+from renderer import EFFECTS, FONT_PATHS, clear_font_cache, make_spec, render_signature
+
+# Rendering benchmarks over the parameter space the app exposes: every bundled
+# font, sizes 30-150, every bold/shadow/underline combination, both
+# backgrounds, and short vs very long names. Rasterization and PNG encoding are
+# timed separately; peak memory is measured in its own pass since tracemalloc
+# slows everything down.
+#
+#   python bench.py run -o before.json
+#   python bench.py run -o after.json
+#   python bench.py compare before.json after.json
+#   python bench.py startup       # import, first-frame and first-preview times
+#   python bench.py memory        # batch peak memory as the row count grows
+
+SIZES = (30, 60, 90, 120, 150)
+NAMES = {
+    "short": "Al",
+    "long": "Wolfgang Amadeus Theophilus Mozart-Pertl von Salzburg",
+}
+BACKGROUNDS = ("White", "Transparent")
+QUICK_SIZES = (30, 90, 150)
+
+# compare flags a metric once it is this much slower (or bigger) than the baseline
+THRESHOLD = 0.10
+
+
+def cases(fonts=None, sizes=SIZES, names=NAMES):
+    for font, size, flags, background, (length, name) in product(
+            fonts or FONT_PATHS, sizes, product((False, True), repeat=len(EFFECTS)),
+            BACKGROUNDS, names.items()):
+        spec = make_spec(name, font, size, "#1a237e", background, *flags)
+        yield {
+            "font": font,
+            "size": size,
+            "effects": "+".join(e for e, on in zip(EFFECTS, flags) if on) or "none",
+            "background": background,
+            "name": length,
+        }, spec
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    if not samples:
+        return {}
+
+    def at(p):
+        return samples[min(len(samples) - 1, int(p * len(samples)))]
+
+    return {
+        "p50": at(0.50), "p90": at(0.90), "p99": at(0.99),
+        "min": samples[0], "max": samples[-1], "mean": sum(samples) / len(samples),
+    }
+
+
+def _time_case(spec, repeat):
+    raster, encode = [], []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        img = render_signature(spec)
+        middle = time.perf_counter()
+        encode_png(img)
+        end = time.perf_counter()
+        raster.append((middle - start) * 1000)
+        encode.append((end - middle) * 1000)
+    return raster, encode
+
+
+def _peak_memory(grid):
+    # Peak Python-level allocations for one render + encode, in KiB. Pillow's
+    # image buffers are allocated outside the Python allocator, so the max RSS
+    # of the whole run is reported alongside.
+    peaks = []
+    for _, spec in grid:
+        tracemalloc.start()
+        encode_png(render_signature(spec))
+        peaks.append(tracemalloc.get_traced_memory()[1] / 1024)
+        tracemalloc.stop()
+    return peaks
+
+
+def _max_rss_kib():
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss // 1024 if sys.platform == "darwin" else rss
+
+
+def run(fonts=None, sizes=SIZES, repeat=5, progress=None):
+    grid = list(cases(fonts, sizes))
+    clear_font_cache()
+    start = time.perf_counter()
+    # Cold pass: first render of every case, including font loading
+    cold = []
+    for _, spec in grid:
+        t = time.perf_counter()
+        render_signature(spec)
+        cold.append((time.perf_counter() - t) * 1000)
+    cold_seconds = time.perf_counter() - start
+
+    results = []
+    gc.collect()
+    gc.disable()
+    try:
+        warm_start = time.perf_counter()
+        for i, (params, spec) in enumerate(grid):
+            raster, encode = _time_case(spec, repeat)
+            results.append((params, raster, encode))
+            if progress and i % 50 == 0:
+                progress(i, len(grid))
+        warm_seconds = time.perf_counter() - warm_start
+    finally:
+        gc.enable()
+    peaks = _peak_memory(grid)
+
+    cases_out = []
+    for (params, raster, encode), first, peak in zip(results, cold, peaks):
+        cases_out.append({**params,
+                          "cold_ms": round(first, 4),
+                          "raster_ms": round(sorted(raster)[len(raster) // 2], 4),
+                          "encode_ms": round(sorted(encode)[len(encode) // 2], 4),
+                          "peak_kib": round(peak, 1)})
+
+    renders = len(grid) * repeat
+    summary = {
+        "cases": len(grid),
+        "renders": renders,
+        "throughput_per_second": round(renders / warm_seconds, 2),
+        "cold_seconds": round(cold_seconds, 3),
+        "cold_ms": _rounded(percentiles(cold)),
+        "raster_ms": _rounded(percentiles([t for _, raster, _ in results for t in raster])),
+        "encode_ms": _rounded(percentiles([t for _, _, encode in results for t in encode])),
+        "total_ms": _rounded(percentiles([r + e for _, raster, encode in results for r, e in zip(raster, encode)])),
+        "peak_kib": _rounded(percentiles(peaks)),
+        "max_rss_kib": _max_rss_kib(),
+    }
+    return {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "pillow": PIL.__version__,
+            "platform": platform.platform(),
+            "repeat": repeat,
+            "sizes": list(sizes),
+            "fonts": list(fonts or FONT_PATHS),
+        },
+        "summary": summary,
+        "groups": _groups(cases_out),
+        "cases": cases_out,
+    }
+
+
+def _rounded(stats):
+    return {key: round(value, 4) for key, value in stats.items()}
+
+
+def _groups(cases_out):
+    # p50/p90 of raster and encode time per value of every parameter
+    groups = {}
+    for param in ("font", "size", "effects", "background", "name"):
+        values = {}
+        for case in cases_out:
+            values.setdefault(str(case[param]), []).append(case)
+        for value, members in values.items():
+            groups[f"{param}={value}"] = {
+                "raster_ms": _rounded(percentiles([c["raster_ms"] for c in members])),
+                "encode_ms": _rounded(percentiles([c["encode_ms"] for c in members])),
+            }
+    return groups
+
+
+# --- Startup ---
+
+# Runs in a fresh interpreter per sample, so every import is cold
+_STARTUP_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import renderer
+rendering = time.perf_counter()
+import v5
+imported = time.perf_counter()
+out = {"import_renderer_ms": (rendering - start) * 1000, "import_v5_ms": (imported - start) * 1000,
+       "tk_imported_headless": "tkinter" in sys.modules}
+if sys.argv[1] == "gui":
+    out.update(v5.startup_timings(start=start))
+print(json.dumps(out))
+"""
+
+
+def startup(repeat=5, gui=True):
+    # ({metric: percentiles}, errors) over `repeat` cold starts. Headless
+    # runs only import; GUI runs also open the window and wait for the first
+    # live preview (needs Tk and a display; reported as an error otherwise).
+    samples = {}
+    errors = []
+    here = os.path.dirname(os.path.abspath(__file__))
+    for mode in ("headless", "gui") if gui else ("headless",):
+        for _ in range(repeat):
+            proc = subprocess.run([sys.executable, "-c", _STARTUP_SCRIPT, mode], cwd=here,
+                                  capture_output=True, text=True)
+            if proc.returncode:
+                errors.append(f"{mode}: {proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else proc.returncode}")
+                break
+            out = json.loads(proc.stdout)
+            if out.pop("tk_imported_headless"):
+                errors.append("headless: tkinter was imported without starting the GUI")
+            for metric, value in out.items():
+                # Imports are timed by the headless runs
+                if mode == "headless" or not metric.startswith("import"):
+                    samples.setdefault(metric, []).append(value)
+    return {metric: percentiles(values) for metric, values in samples.items()}, errors
+
+
+# --- Batch memory ---
+
+MEMORY_ROWS = (200, 800, 3200)
+# Row mix for the memory runs: both backgrounds, gray and colored ink
+_MEMORY_MIX = [("#000000", "White", ""), ("#1a3d8f", "White", "shadow"),
+               ("#000000", "Transparent", "underline"), ("#1a3d8f", "Transparent", "")]
+
+
+def _write_rows(path, count):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        f.write("name,color,background,effects,output\n")
+        for i in range(count):
+            color, background, effects = _MEMORY_MIX[i % len(_MEMORY_MIX)]
+            # Outputs cycle through a fixed set, so disk use does not grow either
+            f.write(f"Signature {i},{color},{background},{effects},{i % 64}.png\n")
+
+
+def _peak_tree_memory(args, interval=0.02):
+    # Runs `args` and samples its process tree until it exits; (peak PSS,
+    # peak RSS) in bytes, or None where /proc is unavailable
+    from workerpool import tree_memory
+
+    proc = subprocess.Popen(args, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    peak = None
+    while proc.poll() is None:
+        memory = tree_memory(proc.pid)
+        if memory is not None:
+            peak = memory if peak is None else {key: max(peak[key], memory[key]) for key in memory}
+        time.sleep(interval)
+    if proc.returncode:
+        raise RuntimeError(proc.stderr.strip() or f"batch.py exited with {proc.returncode}")
+    return peak and (peak["pss"], peak["rss"])
+
+
+def batch_memory(rows=MEMORY_ROWS, workers=2, extra=()):
+    # [(rows, peak PSS, peak RSS, seconds)] for batch.py runs of growing
+    # size; with bounded queues every column should stay flat
+    here = os.path.dirname(os.path.abspath(__file__))
+    out = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for count in rows:
+            path = os.path.join(tmp, f"{count}.csv")
+            _write_rows(path, count)
+            args = [sys.executable, os.path.join(here, "batch.py"), path,
+                    "--output-dir", os.path.join(tmp, "out"), "--workers", str(workers)] + list(extra)
+            start = time.perf_counter()
+            peak = _peak_tree_memory(args)
+            out.append((count,) + (peak or (None, None)) + (time.perf_counter() - start,))
+    return out
+
+
+# --- Comparison ---
+
+def _metrics(result):
+    # Flat {metric: value}; for every metric a higher value is worse
+    summary = result["summary"]
+    flat = {"throughput_per_second (inverse)": 1 / summary["throughput_per_second"]}
+    for metric in ("raster_ms", "encode_ms", "total_ms", "cold_ms", "peak_kib"):
+        for stat in ("p50", "p90", "p99"):
+            flat[f"{metric}.{stat}"] = summary[metric][stat]
+    for group, stats in result["groups"].items():
+        for metric in ("raster_ms", "encode_ms"):
+            flat[f"{group} {metric}.p50"] = stats[metric]["p50"]
+    return flat
+
+
+def compare(baseline, current, threshold=THRESHOLD):
+    # Returns [(metric, baseline, current, change)] for every metric in both
+    # results, plus the subset that regressed by more than `threshold`
+    before, after = _metrics(baseline), _metrics(current)
+    rows = []
+    for metric in before:
+        if metric in after and before[metric]:
+            rows.append((metric, before[metric], after[metric], after[metric] / before[metric] - 1))
+    return rows, [row for row in rows if row[3] > threshold]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark signature rendering.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    run_parser = sub.add_parser("run", help="run the benchmark grid")
+    run_parser.add_argument("-o", "--output", help="write the results as JSON")
+    run_parser.add_argument("--repeat", type=int, default=5, help="timed renders per case")
+    run_parser.add_argument("--quick", action="store_true", help=f"only sizes {QUICK_SIZES}")
+    run_parser.add_argument("--fonts", nargs="*", choices=list(FONT_PATHS), help="restrict to these fonts")
+    startup_parser = sub.add_parser("startup", help="time cold imports, first frame and first preview")
+    startup_parser.add_argument("--repeat", type=int, default=5, help="cold starts per mode")
+    startup_parser.add_argument("--headless", action="store_true", help="only time the imports (no Tk)")
+    startup_parser.add_argument("-o", "--output", help="write the results as JSON")
+    memory_parser = sub.add_parser("memory", help="peak memory of batch.py runs as the row count grows")
+    memory_parser.add_argument("--rows", type=int, nargs="+", default=list(MEMORY_ROWS), help="batch sizes")
+    memory_parser.add_argument("--workers", type=int, default=2)
+    memory_parser.add_argument("--memory-limit", type=float, default=None, metavar="MB",
+                               help="pass --memory-limit MB to batch.py")
+    memory_parser.add_argument("-o", "--output", help="write the results as JSON")
+    compare_parser = sub.add_parser("compare", help="flag regressions between two result files")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=THRESHOLD * 100,
+                                help="percent slowdown that counts as a regression (default: %(default)s)")
+    compare_parser.add_argument("--all", action="store_true", help="print every metric, not just regressions")
+    args = parser.parse_args(argv)
+
+    if args.command == "run":
+        result = run(args.fonts, QUICK_SIZES if args.quick else SIZES, args.repeat,
+                     progress=lambda i, n: print(f"  {i}/{n} cases", file=sys.stderr))
+        summary = result["summary"]
+        print(f"{summary['cases']} cases, {summary['renders']} renders, "
+              f"{summary['throughput_per_second']} renders/sec")
+        for metric in ("raster_ms", "encode_ms", "total_ms", "cold_ms", "peak_kib"):
+            stats = summary[metric]
+            print(f"  {metric:10} p50 {stats['p50']:9.3f}  p90 {stats['p90']:9.3f}  p99 {stats['p99']:9.3f}")
+        print(f"  max RSS {summary['max_rss_kib']} KiB")
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as f:
+                json.dump(result, f, indent=1)
+        return 0
+
+    if args.command == "startup":
+        result, errors = startup(args.repeat, gui=not args.headless)
+        for metric, stats in result.items():
+            print(f"  {metric:28} p50 {stats['p50']:9.3f}  p90 {stats['p90']:9.3f} ms")
+        for error in errors:
+            print(f"error: {error}", file=sys.stderr)
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as f:
+                json.dump({"startup": result, "errors": errors}, f, indent=1)
+        # A GUI run can fail for want of a display; headless failures are real
+        return 1 if any(error.startswith("headless:") for error in errors) else 0
+
+    if args.command == "memory":
+        extra = ["--memory-limit", f"{args.memory_limit:g}"] if args.memory_limit else []
+        result = batch_memory(args.rows, args.workers, extra)
+        mib = 1 << 20
+        for count, pss, rss, seconds in result:
+            memory = "no /proc" if pss is None else f"peak PSS {pss / mib:7.1f} MiB  RSS {rss / mib:7.1f} MiB"
+            print(f"  {count:6d} rows  {memory}  {seconds:6.2f}s")
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as f:
+                json.dump(result, f, indent=1)
+        return 0
+
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    with open(args.current, encoding="utf-8") as f:
+        current = json.load(f)
+    for key in ("fonts", "sizes", "repeat", "pillow", "python"):
+        if baseline["meta"].get(key) != current["meta"].get(key):
+            print(f"warning: runs differ in {key}: {baseline['meta'].get(key)} vs {current['meta'].get(key)}",
+                  file=sys.stderr)
+    rows, regressions = compare(baseline, current, args.threshold / 100)
+    for metric, before, after, change in (rows if args.all else regressions):
+        flag = "REGRESSION " if change > args.threshold / 100 else ""
+        print(f"{flag}{metric}: {before:.4g} -> {after:.4g} ({change:+.1%})")
+    print(f"{len(regressions)} of {len(rows)} metrics regressed by more than {args.threshold:g}%")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
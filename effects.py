@@ -0,0 +1,236 @@
+import sys
+from collections import namedtuple
+from PIL import Image, ImageChops, ImageDraw, ImageFilter
+from instrument import timed
+
+# Effects pipeline: the name is rasterized once into an "L" alpha mask and every
+# effect is derived from that mask instead of drawing the text again. Stages
+# run in STAGES order; each one may replace ctx.mask (e.g. bold) and/or add
+# colored layers, which are then composited onto the canvas by z order.
+#
+# Stage parameters are in pixels at scale 1; stages multiply them by
+# ctx.scale when the signature is rasterized larger (see multires.py).
+#
+# New effects are added with register_effect() and cost mask operations only:
+#
+#   register_effect("glow", partial(glow, color="#ffd54f", radius=6))
+
+# z order of the built-in layers; the text itself is drawn at TEXT_Z
+GLOW_Z = -30
+SHADOW_Z = -20
+TEXT_Z = 0
+OUTLINE_Z = 5
+UNDERLINE_Z = 10
+
+Layer = namedtuple("Layer", ["z", "mask", "offset", "fill"])
+
+
+class EffectContext:
+    def __init__(self, spec, mask, offset, text_box, scale=1):
+        self.spec = spec
+        self.scale = scale
+        self.mask = mask            # current text mask ("L")
+        self.offset = offset        # canvas position of the mask's top-left corner
+        self.text_box = text_box    # (x, y, width, height) of the centered text
+        self.text_fill = spec.color
+        self.layers = []
+
+    def px(self, value):
+        # A pixel distance at scale 1, at the current scale
+        return max(1, round(value * self.scale)) if value else 0
+
+    def add_layer(self, z, mask, offset, fill):
+        self.layers.append(Layer(z, mask, offset, fill))
+
+
+def pad(mask, offset, border):
+    padded = Image.new("L", (mask.size[0] + 2 * border, mask.size[1] + 2 * border))
+    padded.paste(mask, (border, border))
+    return padded, (offset[0] - border, offset[1] - border)
+
+
+def dilate(mask, offset, offsets=((0, 0), (1, 0), (0, 1), (1, 1))):
+    # Union of shifted copies, combined like overlapping ink ("screen")
+    width = max(dx for dx, _ in offsets) + 1
+    height = max(dy for _, dy in offsets) + 1
+    out = Image.new("L", (mask.size[0] + width - 1, mask.size[1] + height - 1))
+    for dx, dy in offsets:
+        box = (dx, dy, dx + mask.size[0], dy + mask.size[1])
+        out.paste(ImageChops.screen(out.crop(box), mask), box)
+    return out, offset
+
+
+# --- Built-in stages ---
+
+def glow(ctx, color="#fff59d", radius=6):
+    radius = ctx.px(radius)
+    mask, offset = pad(ctx.mask, ctx.offset, radius * 2)
+    mask = mask.filter(ImageFilter.MaxFilter(2 * ctx.px(1) + 1)).filter(ImageFilter.GaussianBlur(radius))
+    ctx.add_layer(GLOW_Z, mask, offset, color)
+
+
+def shadow(ctx, distance=3, blur=0, color="gray"):
+    distance, blur = ctx.px(distance), ctx.px(blur)
+    mask, offset = ctx.mask, ctx.offset
+    if blur:
+        mask, offset = pad(mask, offset, blur * 2)
+        mask = mask.filter(ImageFilter.GaussianBlur(blur))
+    ctx.add_layer(SHADOW_Z, mask, (offset[0] + distance, offset[1] + distance), color)
+
+
+def bold(ctx):
+    reach = range(ctx.px(1) + 1)
+    ctx.mask, ctx.offset = dilate(ctx.mask, ctx.offset, [(dx, dy) for dy in reach for dx in reach])
+
+
+def outline(ctx, width=2, fill="white"):
+    # Ink-colored ring around the glyphs, with the inside filled by `fill`
+    width = ctx.px(width)
+    mask, offset = pad(ctx.mask, ctx.offset, width)
+    ring = ImageChops.subtract(mask.filter(ImageFilter.MaxFilter(2 * width + 1)), mask)
+    ctx.add_layer(OUTLINE_Z, ring, offset, ctx.spec.color)
+    ctx.text_fill = fill
+
+
+def underline(ctx, gap=5, thickness=3):
+    gap, thickness = ctx.px(gap), ctx.px(thickness)
+    x, y, width, height = ctx.text_box
+    line = Image.new("L", (width + 1, thickness), 255)
+    ctx.add_layer(UNDERLINE_Z, line, (x, y + height + gap - thickness // 2), ctx.spec.color)
+
+
+# Runs in this order; mask-changing stages affect every stage after them
+STAGES = [
+    ("glow", glow),
+    ("shadow", shadow),
+    ("bold", bold),
+    ("outline", outline),
+    ("underline", underline),
+]
+
+# How far each effect reaches past the text box, as (left, top, right, bottom)
+# pixels at the default stage settings; used to fit text to the canvas
+EXTENTS = {
+    "glow": (12, 12, 12, 12),
+    "shadow": (0, 0, 3, 3),
+    "bold": (0, 0, 1, 1),
+    "outline": (2, 2, 2, 2),
+    "underline": (0, 0, 1, 7),
+}
+
+
+def register_effect(name, stage, before=None, extent=None):
+    # Adds or replaces a stage; new stages run last unless `before` is given
+    names = [n for n, _ in STAGES]
+    if name in names:
+        STAGES[names.index(name)] = (name, stage)
+    elif before in names:
+        STAGES.insert(names.index(before), (name, stage))
+    else:
+        STAGES.append((name, stage))
+    if extent is not None:
+        EXTENTS[name] = tuple(extent)
+
+
+def available_effects():
+    return [name for name, _ in STAGES]
+
+
+def effect_extent(effects):
+    # Combined reach of a set of effects. Conservative: bold's growth is added
+    # on top of the others, since stages after it see the dilated mask.
+    left = top = right = bottom = 0
+    for name in effects:
+        if name != "bold":
+            l, t, r, b = EXTENTS.get(name, (0, 0, 0, 0))
+            left, top, right, bottom = max(left, l), max(top, t), max(right, r), max(bottom, b)
+    if "bold" in effects:
+        l, t, r, b = EXTENTS["bold"]
+        left, top, right, bottom = left + l, top + t, right + r, bottom + b
+    return left, top, right, bottom
+
+
+def text_mask(font, text):
+    # The single rasterization of the name: an "L" mask and its offset
+    if hasattr(font, "getmask2"):
+        core, offset = font.getmask2(text, "L")
+    else:
+        core = font.getmask(text, "L")
+        offset = font.getbbox(text)[:2]
+    if not core.size[0] or not core.size[1]:
+        return Image.new("L", (0, 0)), tuple(offset)
+    return Image.frombytes("L", core.size, bytes(core)), tuple(offset)
+
+
+def apply_effects(spec, mask, offset, text_box, scale=1):
+    ctx = EffectContext(spec, mask, offset, text_box, scale)
+    for name, stage in STAGES:
+        if name in spec.effects:
+            with timed("effect." + name) as span:
+                mask, layers = ctx.mask, len(ctx.layers)
+                stage(ctx)
+                new = [layer.mask for layer in ctx.layers[layers:]] + ([ctx.mask] if ctx.mask is not mask else [])
+                span.add_bytes(sum(m.size[0] * m.size[1] for m in new))
+    ctx.add_layer(TEXT_Z, ctx.mask, ctx.offset, ctx.text_fill)
+    return sorted(ctx.layers, key=lambda layer: layer.z)
+
+
+def composite(img, layers):
+    with timed("composite"):
+        draw = ImageDraw.Draw(img)
+        for layer in layers:
+            if layer.mask.size[0] and layer.mask.size[1]:
+                draw.bitmap(layer.offset, layer.mask, fill=layer.fill)
+    return img
+
+
+def _overdraw_reference(spec, font):
+    # The original v4/v5 rendering with one draw.text per effect pass
+    width, height = spec.canvas
+    img = Image.new("RGBA", (width, height), (255, 255, 255, 0) if spec.background == "Transparent" else "white")
+    draw = ImageDraw.Draw(img)
+    bbox = draw.textbbox((0, 0), spec.name, font=font)
+    text_width = bbox[2] - bbox[0]
+    text_height = bbox[3] - bbox[1]
+    position = ((width - text_width) // 2, (height - text_height) // 2)
+    if "shadow" in spec.effects:
+        draw.text((position[0]+3, position[1]+3), spec.name, fill="gray", font=font)
+    if "bold" in spec.effects:
+        for dx, dy in [(0,0), (1,0), (0,1), (1,1)]:
+            draw.text((position[0]+dx, position[1]+dy), spec.name, fill=spec.color, font=font)
+    else:
+        draw.text(position, spec.name, fill=spec.color, font=font)
+    if "underline" in spec.effects:
+        underline_y = position[1] + text_height + 5
+        draw.line((position[0], underline_y, position[0]+text_width, underline_y), fill=spec.color, width=3)
+    return img
+
+
+def check(names=("R.Maunick", "Wolfgang Amadeus Mozart"), sizes=(30, 80, 150), tolerance=4):
+    # Compares the pipeline with the original overdraw rendering for every
+    # bundled font and combination of bold/shadow/underline. Overdrawing bold
+    # rounds four times, hence the small tolerance. Bold on variable fonts
+    # uses the weight axis instead (see renderer.render_font) and is skipped.
+    from itertools import product
+    from renderer import EFFECTS, FONT_PATHS, load_font, make_spec, render_font, render_signature
+
+    failures = []
+    for font, size, name, flags in product(FONT_PATHS, sizes, names, product((False, True), repeat=len(EFFECTS))):
+        for background in ("White", "Transparent"):
+            spec = make_spec(name, font, size, "#1a237e", background, *flags)
+            if render_font(spec)[1] != spec.effects:
+                continue
+            expected = _overdraw_reference(spec, load_font(font, size))
+            diff = max(high for _, high in ImageChops.difference(expected, render_signature(spec)).getextrema())
+            if diff > tolerance:
+                failures.append((font, size, name, ",".join(sorted(spec.effects)), background, diff))
+    return failures
+
+
+if __name__ == "__main__":
+    if "--check" in sys.argv[1:]:
+        failures = check()
+        for failure in failures:
+            print("mismatch: font=%r size=%d name=%r effects=%r background=%s max diff=%d" % failure)
+        print("effects pipeline matches overdraw rendering" if not failures else f"{len(failures)} mismatches")
+        sys.exit(1 if failures else 0)
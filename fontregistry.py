@@ -0,0 +1,261 @@
+import argparse
+import json
+import os
+import sys
+import tempfile
+from bisect import bisect_right
+from collections import namedtuple
+from functools import lru_cache
+from renderer import FONT_DIR, FONT_PATHS, resolve_font_path
+
+# Font registry: scans font directories once and keeps each font's names,
+# metrics, variable axes and cmap coverage in a JSON index next to the fonts.
+# Entries are keyed by path and reused while the file's mtime and size are
+# unchanged, so later startups only stat the files and never open them.
+# Coverage is stored as sorted codepoint ranges, which makes "which fonts can
+# render this name" a lookup instead of a trial render.
+#
+# Indexing new or changed fonts needs fontTools (pip install fonttools); an
+# existing index loads without it.
+#
+#   registry = default_registry()
+#   registry.fonts_covering("Zoë Ångström")
+#   resolve_font("Alex Brush Regular")   # a spec's font for a user-given name
+#
+# Extra directories can be listed in SIGNATURE_FONT_DIRS (os.pathsep separated).
+
+INDEX_NAME = ".font_index.json"
+INDEX_VERSION = 1
+FONT_EXTENSIONS = (".ttf", ".otf")
+
+FontInfo = namedtuple("FontInfo", [
+    "path", "mtime_ns", "size",
+    "family", "style", "full_name", "postscript_name",
+    "units_per_em", "ascent", "descent", "line_gap", "cap_height", "x_height",
+    "axes",      # [[tag, min, default, max], ...]; empty for static fonts
+    "coverage",  # [[first, last], ...] inclusive codepoint ranges
+])
+
+
+def _ranges(codepoints):
+    ranges = []
+    for cp in sorted(codepoints):
+        if ranges and cp == ranges[-1][1] + 1:
+            ranges[-1][1] = cp
+        else:
+            ranges.append([cp, cp])
+    return ranges
+
+
+def read_font_info(path, stat=None):
+    from fontTools.ttLib import TTFont
+
+    stat = stat or os.stat(path)
+    font = TTFont(path, lazy=True)
+    try:
+        names = font["name"]
+
+        def name(*ids):
+            for name_id in ids:
+                value = names.getDebugName(name_id)
+                if value:
+                    return value
+            return ""
+
+        os2 = font["OS/2"] if "OS/2" in font else None
+        hhea = font["hhea"]
+        axes = [[a.axisTag, a.minValue, a.defaultValue, a.maxValue] for a in font["fvar"].axes] if "fvar" in font else []
+        return FontInfo(
+            path, stat.st_mtime_ns, stat.st_size,
+            name(16, 1), name(17, 2), name(4), name(6),
+            font["head"].unitsPerEm, hhea.ascent, hhea.descent, hhea.lineGap,
+            getattr(os2, "sCapHeight", 0), getattr(os2, "sxHeight", 0),
+            axes, _ranges(font.getBestCmap() or {}),
+        )
+    finally:
+        font.close()
+
+
+class FontRegistry:
+    def __init__(self, dirs, index_path=None):
+        self.dirs = [os.path.abspath(d) for d in dirs]
+        self.index_path = index_path or os.path.join(self.dirs[0], INDEX_NAME)
+        self.fonts = {}    # path -> FontInfo
+        self.errors = {}   # path -> why it could not be indexed
+        self._starts = {}  # path -> range start points for bisect
+
+    def load(self):
+        # Reads the index, re-reads only new or changed fonts, and rewrites
+        # the index if anything changed
+        cached = self._read_index()
+        fonts = {}
+        self.errors = {}
+        for path, stat in self._scan():
+            info = cached.get(path)
+            if info is None or (info.mtime_ns, info.size) != (stat.st_mtime_ns, stat.st_size):
+                try:
+                    info = read_font_info(path, stat)
+                except ImportError:
+                    self.errors[path] = "fontTools is required to index fonts (pip install fonttools)"
+                    continue
+                except Exception as e:
+                    self.errors[path] = f"{type(e).__name__}: {e}"
+                    continue
+            fonts[path] = info
+        changed = fonts != cached
+        self.fonts = dict(sorted(fonts.items(), key=lambda item: (item[1].family.lower(), item[1].style.lower())))
+        self._starts = {}
+        if changed:
+            self._write_index()
+        return self
+
+    def _scan(self):
+        for directory in self.dirs:
+            try:
+                entries = sorted(os.scandir(directory), key=lambda e: e.name)
+            except OSError:
+                continue
+            for entry in entries:
+                if entry.name.lower().endswith(FONT_EXTENSIONS) and entry.is_file():
+                    yield entry.path, entry.stat()
+
+    def _read_index(self):
+        try:
+            with open(self.index_path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if data.get("version") != INDEX_VERSION:
+            return {}
+        try:
+            return {entry["path"]: FontInfo(**entry) for entry in data["fonts"]}
+        except (KeyError, TypeError):
+            return {}
+
+    def _write_index(self):
+        data = {"version": INDEX_VERSION, "fonts": [info._asdict() for info in self.fonts.values()]}
+        directory = os.path.dirname(self.index_path) or "."
+        try:
+            fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(data, f, separators=(",", ":"))
+            os.replace(tmp, self.index_path)
+        except OSError:
+            pass  # read-only font directory: keep working from memory
+
+    # --- Queries ---
+
+    def info(self, font):
+        # FontInfo for a FONT_PATHS key or a path, or None if not indexed
+        return self.fonts.get(os.path.abspath(resolve_font_path(font)))
+
+    def missing(self, font, text):
+        # Characters of `text` the font has no glyph for (control characters are ignored)
+        info = self.info(font)
+        if info is None:
+            return []
+        starts = self._starts.get(info.path)
+        if starts is None:
+            starts = self._starts[info.path] = [first for first, _ in info.coverage]
+        out = []
+        for char in dict.fromkeys(text):
+            cp = ord(char)
+            if cp < 32:
+                continue
+            i = bisect_right(starts, cp) - 1
+            if i < 0 or cp > info.coverage[i][1]:
+                out.append(char)
+        return out
+
+    def lookup(self, name):
+        # Path of the indexed font whose path, file name, full name or
+        # PostScript name is `name` (case-insensitive), or None
+        path = os.path.abspath(name)
+        if path in self.fonts:
+            return path
+        key = name.strip().lower()
+        if not key:
+            return None
+        for path, info in self.fonts.items():
+            if key in (os.path.basename(path).lower(), info.full_name.lower(), info.postscript_name.lower()):
+                return path
+        return None
+
+    def covers(self, font, text):
+        return not self.missing(font, text)
+
+    def fonts_covering(self, text):
+        return [info for info in self.fonts.values() if not self.missing(info.path, text)]
+
+    def fallback(self, text, preferred=None):
+        # `preferred` if it can render the text, otherwise the first indexed font that can
+        if preferred is not None and self.info(preferred) is not None and self.covers(preferred, text):
+            return preferred
+        covering = self.fonts_covering(text)
+        return covering[0].path if covering else preferred
+
+
+def font_dirs():
+    extra = os.environ.get("SIGNATURE_FONT_DIRS", "")
+    return [FONT_DIR] + [d for d in extra.split(os.pathsep) if d]
+
+
+def default_registry():
+    return FontRegistry(font_dirs()).load()
+
+
+@lru_cache(maxsize=None)
+def shared_registry():
+    # One registry per process, loaded on first use
+    return default_registry()
+
+
+def resolve_font(font, registry=None):
+    # A spec's font for a user-given name: FONT_PATHS keys pass through, a
+    # bundled font named any other way becomes its key, and other indexed
+    # fonts become their path. Fonts outside the registry are rejected.
+    if font in FONT_PATHS:
+        return font
+    path = (registry or shared_registry()).lookup(font)
+    if path is None:
+        raise ValueError(f"unknown font: {font}")
+    for key, bundled in FONT_PATHS.items():
+        if os.path.abspath(resolve_font_path(bundled)) == path:
+            return key
+    return path
+
+
+def font_choices(registry):
+    # Picker entries: the bundled FONT_PATHS labels first, then every other
+    # indexed font under its full name. Values are usable as a spec's font.
+    choices = dict(FONT_PATHS)
+    bundled = {os.path.abspath(resolve_font_path(path)) for path in FONT_PATHS.values()}
+    for path, info in registry.fonts.items():
+        if path not in bundled:
+            label = info.full_name or os.path.basename(path)
+            while label in choices:
+                label += " "
+            choices[label] = path
+    return choices
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Index fonts and query which ones can render a name.")
+    parser.add_argument("dirs", nargs="*", help="font directories (default: bundled fonts + SIGNATURE_FONT_DIRS)")
+    parser.add_argument("--index", help=f"index file (default: {INDEX_NAME} in the first directory)")
+    parser.add_argument("--covering", metavar="NAME", help="list only fonts with glyphs for every character of NAME")
+    args = parser.parse_args(argv)
+
+    registry = FontRegistry(args.dirs or font_dirs(), args.index).load()
+    for path, error in registry.errors.items():
+        print(f"{path}: {error}", file=sys.stderr)
+    fonts = registry.fonts_covering(args.covering) if args.covering else registry.fonts.values()
+    for info in fonts:
+        axes = " ".join(f"{tag}={lo:g}..{hi:g}" for tag, lo, _, hi in info.axes)
+        glyphs = sum(last - first + 1 for first, last in info.coverage)
+        print(f"{info.family} {info.style}\t{glyphs} chars\t{axes}\t{info.path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,94 @@
+from PIL import Image, ImageChops
+
+# Per-(font, size) cache of glyph alpha masks, advances and kerning. A name is
+# composed by pasting cached masks at their pen positions, so only glyphs that
+# haven't been seen before are rasterized by FreeType.
+#
+# Composition follows Pillow's basic layout (advance + pair kerning, no
+# shaping), which is what draw.text uses unless libraqm is installed.
+
+
+class GlyphAtlas:
+    def __init__(self, font):
+        self.font = font
+        self._glyphs = {}
+        self._advances = {}
+        self._kerning = {}
+
+    def glyph(self, char):
+        # (mask or None for blank glyphs, offset from the pen position)
+        entry = self._glyphs.get(char)
+        if entry is None:
+            core, offset = self.font.getmask2(char, "L")
+            mask = Image.frombytes("L", core.size, bytes(core)) if core.size[0] and core.size[1] else None
+            entry = self._glyphs.setdefault(char, (mask, offset))
+        return entry
+
+    def advance(self, char):
+        width = self._advances.get(char)
+        if width is None:
+            width = self._advances.setdefault(char, self.font.getlength(char))
+        return width
+
+    def kerning(self, left, right):
+        pair = left + right
+        kern = self._kerning.get(pair)
+        if kern is None:
+            kern = self.font.getlength(pair) - self.advance(left) - self.advance(right)
+            kern = self._kerning.setdefault(pair, kern)
+        return kern
+
+    def pen_positions(self, text):
+        # Yields (char, x) with the pen position of every character
+        pen = 0
+        previous = None
+        for char in text:
+            if previous is not None:
+                pen += self.advance(previous) + self.kerning(previous, char)
+            yield char, int(round(pen))
+            previous = char
+
+    def layout(self, text):
+        # Yields (mask, x, y) for every visible glyph, relative to the origin
+        for char, pen in self.pen_positions(text):
+            mask, (dx, dy) = self.glyph(char)
+            if mask is not None:
+                yield mask, pen + dx, dy
+
+    def bbox(self, text):
+        # Same as font.getbbox(text), from cached glyph boxes; like Pillow,
+        # blank glyphs such as spaces still span their advance
+        left = top = right = bottom = None
+        for char, pen in self.pen_positions(text):
+            mask, (dx, dy) = self.glyph(char)
+            if mask is not None:
+                box = (pen + dx, dy, pen + dx + mask.size[0], dy + mask.size[1])
+                top = box[1] if top is None else min(top, box[1])
+                bottom = box[3] if bottom is None else max(bottom, box[3])
+            else:
+                box = (pen, None, pen + int(round(self.advance(char))), None)
+            left = box[0] if left is None else min(left, box[0])
+            right = box[2] if right is None else max(right, box[2])
+        if top is None:
+            return 0, 0, right or 0, 0
+        return left, top, right, bottom
+
+    def text_mask(self, text):
+        # Same contract as font.getmask2(text, "L"): an "L" mask and its offset
+        left, top, right, bottom = self.bbox(text)
+        out = Image.new("L", (right - left, bottom - top))
+        for mask, x, y in self.layout(text):
+            box = (x - left, y - top, x - left + mask.size[0], y - top + mask.size[1])
+            # FreeType coverage of overlapping glyphs combines like "screen"
+            out.paste(ImageChops.screen(out.crop(box), mask), box)
+        return out, (left, top)
+
+
+def glyph_atlas(font):
+    # The atlas is stored on the font, so it lives exactly as long as the
+    # font (the renderer's font LRU bounds both) and anyone holding the atlas
+    # keeps its font usable. Racing threads may both build one; either works.
+    atlas = getattr(font, "_glyph_atlas", None)
+    if atlas is None:
+        atlas = font._glyph_atlas = GlyphAtlas(font)
+    return atlas
@@ -0,0 +1,213 @@
+import json
+import os
+import threading
+import time
+from collections import namedtuple
+
+# Per-stage timing for renders. Code marks its stages with timed():
+#
+#   with timed("mask") as span:
+#       mask, offset = text_mask(font, name)
+#       span.add_bytes(mask.size[0] * mask.size[1])
+#
+# Every finished span is passed to the installed hooks as a StageEvent. With
+# no hooks installed timed() returns a shared no-op span, so instrumentation
+# left in the render path costs a function call per stage.
+#
+#   stats = StageStats()
+#   with instrumented(stats):
+#       render_signature(spec)
+#   print(stats.report())
+
+StageEvent = namedtuple("StageEvent", ["stage", "start_ns", "duration_ns", "bytes", "pid", "tid"])
+
+_hooks = ()
+
+
+class Span:
+    __slots__ = ("stage", "start", "bytes")
+
+    def __init__(self, stage):
+        self.stage = stage
+        self.bytes = 0
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        event = StageEvent(self.stage, self.start, time.perf_counter_ns() - self.start, self.bytes,
+                           os.getpid(), threading.get_ident())
+        for hook in _hooks:
+            hook(event)
+        return False
+
+    def add_bytes(self, n):
+        # Size of what the stage allocated or produced
+        self.bytes += n
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def add_bytes(self, n):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def timed(stage):
+    return Span(stage) if _hooks else _NULL_SPAN
+
+
+def enabled():
+    return bool(_hooks)
+
+
+def add_hook(hook):
+    # A hook is any callable taking a StageEvent; it runs on the rendering thread
+    global _hooks
+    _hooks = _hooks + (hook,)
+
+
+def remove_hook(hook):
+    global _hooks
+    _hooks = tuple(h for h in _hooks if h is not hook)
+
+
+def emit(event):
+    # Feeds an event recorded elsewhere (e.g. in a worker process) to the hooks
+    for hook in _hooks:
+        hook(event)
+
+
+class instrumented:
+    # Installs hooks for the duration of a with block
+    def __init__(self, *hooks):
+        self.hooks = hooks
+
+    def __enter__(self):
+        for hook in self.hooks:
+            add_hook(hook)
+        return self.hooks[0] if len(self.hooks) == 1 else self.hooks
+
+    def __exit__(self, *exc):
+        for hook in self.hooks:
+            remove_hook(hook)
+        return False
+
+
+class suspended:
+    # Removes every hook for the duration of a with block, so work such as a
+    # pool's warm-up renders is left out of the measurements. Hooks are
+    # process-wide: spans other threads finish meanwhile are not seen either.
+    def __enter__(self):
+        global _hooks
+        self.hooks, _hooks = _hooks, ()
+        return self
+
+    def __exit__(self, *exc):
+        global _hooks
+        _hooks = self.hooks + tuple(h for h in _hooks if h not in self.hooks)
+        return False
+
+
+# --- Built-in hooks ---
+
+class StageStats:
+    # Aggregates events into per-stage counts, totals and log2 histograms:
+    # bucket i holds durations below 2**i microseconds (and >= 2**(i-1))
+    BUCKETS = 32
+
+    def __init__(self):
+        self.stages = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, event):
+        micros = event.duration_ns // 1000
+        with self._lock:
+            entry = self.stages.get(event.stage)
+            if entry is None:
+                entry = self.stages[event.stage] = {"count": 0, "total_ns": 0, "max_ns": 0, "bytes": 0,
+                                                    "histogram": [0] * self.BUCKETS}
+            entry["count"] += 1
+            entry["total_ns"] += event.duration_ns
+            entry["max_ns"] = max(entry["max_ns"], event.duration_ns)
+            entry["bytes"] += event.bytes
+            entry["histogram"][min(self.BUCKETS - 1, micros.bit_length())] += 1
+
+    def histogram(self, stage):
+        # [(upper bound in microseconds, count)] for the non-empty range
+        counts = self.stages[stage]["histogram"]
+        used = [i for i, count in enumerate(counts) if count]
+        return [(1 << i, counts[i]) for i in range(used[0], used[-1] + 1)] if used else []
+
+    def percentile(self, stage, p):
+        # Upper bound of the bucket holding the p-th percentile, in milliseconds
+        entry = self.stages[stage]
+        rank = p * entry["count"]
+        seen = 0
+        for i, count in enumerate(entry["histogram"]):
+            seen += count
+            if count and seen >= rank:
+                return (1 << i) / 1000
+        return entry["max_ns"] / 1e6
+
+    def summary(self):
+        out = {}
+        for stage, entry in self.stages.items():
+            out[stage] = {
+                "count": entry["count"],
+                "total_ms": entry["total_ns"] / 1e6,
+                "mean_ms": entry["total_ns"] / entry["count"] / 1e6,
+                "p50_ms": self.percentile(stage, 0.5),
+                "p90_ms": self.percentile(stage, 0.9),
+                "p99_ms": self.percentile(stage, 0.99),
+                "max_ms": entry["max_ns"] / 1e6,
+                "mean_bytes": entry["bytes"] // entry["count"],
+                "histogram": self.histogram(stage),
+            }
+        return out
+
+    def report(self):
+        lines = [f"{'stage':24} {'count':>8} {'total ms':>10} {'mean ms':>9} {'p50<=':>8} {'p99<=':>8} {'mean KiB':>9}"]
+        for stage, s in sorted(self.summary().items(), key=lambda item: -item[1]["total_ms"]):
+            lines.append(f"{stage:24} {s['count']:8d} {s['total_ms']:10.1f} {s['mean_ms']:9.3f} "
+                         f"{s['p50_ms']:8.3f} {s['p99_ms']:8.3f} {s['mean_bytes'] / 1024:9.1f}")
+        return "\n".join(lines)
+
+
+class TraceRecorder:
+    # Keeps raw events (up to max_events) for a Chrome trace / Perfetto dump
+    def __init__(self, max_events=1_000_000):
+        self.events = []
+        self.max_events = max_events
+        self.dropped = 0
+
+    def __call__(self, event):
+        if len(self.events) < self.max_events:
+            self.events.append(event)
+        else:
+            self.dropped += 1
+
+    def chrome_trace(self):
+        return {
+            "traceEvents": [{
+                "name": e.stage, "ph": "X", "ts": e.start_ns / 1000, "dur": e.duration_ns / 1000,
+                "pid": e.pid, "tid": e.tid, "args": {"bytes": e.bytes},
+            } for e in self.events],
+            "displayTimeUnit": "ms",
+            "otherData": {"dropped_events": self.dropped},
+        }
+
+    def dump(self, path):
+        # Open in chrome://tracing or https://ui.perfetto.dev
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.chrome_trace(), f)
@@ -0,0 +1,119 @@
+import argparse
+import hashlib
+import json
+import sqlite3
+import sys
+import time
+
+# Batch manifest: a SQLite file recording, per output key, the hash of the
+# render spec, the content hash of its font and the checksum and size of the
+# output that was written. batch.py --manifest uses it to skip rows whose
+# spec and font are unchanged since the last run, and to copy the output of
+# an identical spec (this run or an earlier one) instead of rendering again.
+#
+#   python batch.py employees.csv --output-dir out/ --manifest out/manifest.db
+#   python manifest.py out/manifest.db        # summary
+#
+# RENDER_VERSION is part of every spec hash; bump it when a change to the
+# renderer or effects alters output, so the next run re-renders everything.
+
+RENDER_VERSION = 1
+SCHEMA_VERSION = 1
+
+
+def spec_hash(spec, **settings):
+    # Hash of everything that determines the output except the font file's
+    # content, which is tracked separately. `settings` are run options that
+    # change the bytes written (compact, atlas, output format, auto-fit).
+    fields = spec._asdict()
+    del fields["font"]
+    fields["effects"] = sorted(spec.effects)
+    fields["canvas"] = list(spec.canvas)
+    blob = json.dumps([RENDER_VERSION, fields, settings], sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+def checksum(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def file_checksum(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+class Manifest:
+    def __init__(self, path):
+        self.path = path
+        self._db = sqlite3.connect(path)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        if self._db.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+            self._db.execute("DROP TABLE IF EXISTS outputs")
+            self._db.execute("PRAGMA user_version=%d" % SCHEMA_VERSION)
+        self._db.execute("CREATE TABLE IF NOT EXISTS outputs (key TEXT PRIMARY KEY, spec_hash TEXT NOT NULL, "
+                         "font_hash TEXT NOT NULL, checksum TEXT NOT NULL, size INTEGER NOT NULL, "
+                         "updated REAL NOT NULL)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS outputs_by_spec ON outputs (spec_hash, font_hash)")
+        self._db.commit()
+
+    def get(self, key):
+        # (spec_hash, font_hash, checksum, size) recorded for `key`, or None
+        return self._db.execute("SELECT spec_hash, font_hash, checksum, size FROM outputs WHERE key = ?",
+                                (key,)).fetchone()
+
+    def find(self, spec_hash, font_hash):
+        # [(key, checksum, size)] of outputs rendered from this spec and font
+        return self._db.execute("SELECT key, checksum, size FROM outputs WHERE spec_hash = ? AND font_hash = ?",
+                                (spec_hash, font_hash)).fetchall()
+
+    def put(self, key, spec_hash, font_hash, checksum, size):
+        self._db.execute("INSERT OR REPLACE INTO outputs VALUES (?, ?, ?, ?, ?, ?)",
+                         (key, spec_hash, font_hash, checksum, size, time.time()))
+
+    def forget(self, key):
+        self._db.execute("DELETE FROM outputs WHERE key = ?", (key,))
+
+    def commit(self):
+        self._db.commit()
+
+    def summary(self):
+        count, size, specs = self._db.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0), COUNT(DISTINCT spec_hash || font_hash) FROM outputs").fetchone()
+        return {"outputs": count, "bytes": size, "distinct_specs": specs}
+
+    def close(self):
+        self._db.commit()
+        self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Summarize a batch manifest.")
+    parser.add_argument("manifest")
+    parser.add_argument("key", nargs="?", help="show the entry for one output key")
+    args = parser.parse_args(argv)
+
+    with Manifest(args.manifest) as manifest:
+        if args.key is None:
+            print(json.dumps(manifest.summary()))
+            return 0
+        entry = manifest.get(args.key)
+        if entry is None:
+            print(f"{args.key}: not in {args.manifest}", file=sys.stderr)
+            return 1
+        print(json.dumps(dict(zip(["spec_hash", "font_hash", "checksum", "size"], entry))))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,114 @@
+import argparse
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+from export import PNG_OPTIONS, compact_image, encode
+from instrument import timed
+from renderer import DEFAULT_FONT, FONT_PATHS, make_spec, render_signature
+
+# Multi-resolution export: a signature at several densities (1x/2x/3x or a
+# list of DPIs) from one rasterization at the largest scale, so every size has
+# the same geometry. Smaller sizes are derived by box reduction (integer
+# ratios) or reduce + Lanczos, on premultiplied alpha, and all PNGs are
+# encoded in parallel with their DPI in the pHYs chunk.
+#
+#   python multires.py "R.Maunick" --scales 1 2 3
+#   python multires.py "R.Maunick" --dpi 96 150 300 --compact
+
+# The canvas size at scale 1 corresponds to this density
+BASE_DPI = 96
+
+# For non-integer ratios, box-reduce down to within this factor of the
+# target before the Lanczos pass; see Image.resize(reducing_gap=...)
+REDUCING_GAP = 2.0
+
+
+def scales_for_dpi(dpis, base_dpi=BASE_DPI):
+    return [dpi / base_dpi for dpi in dpis]
+
+
+def _size(spec, scale):
+    return tuple(max(1, round(n * scale)) for n in spec.canvas)
+
+
+def render_scales(spec, scales, atlas=False):
+    # {scale: RGBA image}; rasterized once at max(scales). Each smaller size
+    # is box-reduced from the smallest level it divides evenly (exact area
+    # averaging, e.g. 1x from 2x or 3x), otherwise Lanczos-resampled from the
+    # largest level.
+    scales = sorted(set(scales), reverse=True)
+    top = scales[0]
+    master = render_signature(spec, atlas=atlas, scale=top)
+    out = {top: master}
+    for scale in scales[1:]:
+        size = _size(spec, scale)
+        with timed("downsample") as span:
+            for level in sorted(out, key=lambda s: out[s].size):
+                factor = out[level].size[0] // size[0]
+                if factor > 1 and out[level].size == (size[0] * factor, size[1] * factor):
+                    out[scale] = out[level].reduce(factor)
+                    break
+            else:
+                out[scale] = master.resize(size, Image.LANCZOS, reducing_gap=REDUCING_GAP)
+            span.add_bytes(size[0] * size[1] * 4)
+    return out
+
+
+def label_for(scale, dpi=None):
+    if dpi is not None:
+        return f"{dpi:g}dpi"
+    return f"@{scale:g}x"
+
+
+def export_scales(spec, scales=(1, 2, 3), dpis=None, base_dpi=BASE_DPI, compact=False, workers=None, atlas=False):
+    # Returns [(label, scale, dpi, png bytes)] largest first. With `dpis`, the
+    # scales are derived from them and labelled by DPI.
+    if dpis:
+        targets = list(zip(scales_for_dpi(dpis, base_dpi), dpis))
+    else:
+        targets = [(scale, None) for scale in scales]
+    images = render_scales(spec, [scale for scale, _ in targets], atlas)
+
+    def encode_one(target):
+        scale, dpi = target
+        img = images[scale]
+        if compact:
+            img = compact_image(img, padding=max(1, round(10 * scale)))
+        density = dpi if dpi is not None else base_dpi * scale
+        return label_for(scale, dpi), scale, density, encode(img, dpi=(density, density), **PNG_OPTIONS)
+
+    targets.sort(key=lambda target: -target[0])
+    # PNG encoding releases the GIL, so threads encode the sizes in parallel
+    with ThreadPoolExecutor(workers or min(len(targets), os.cpu_count() or 1)) as pool:
+        return list(pool.map(encode_one, targets))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export a signature at several scales or DPIs.")
+    parser.add_argument("name")
+    parser.add_argument("--font", default=DEFAULT_FONT, choices=list(FONT_PATHS))
+    parser.add_argument("--size", type=int, default=80)
+    parser.add_argument("--color", default="#000000")
+    parser.add_argument("--background", default="White", choices=["White", "Transparent"])
+    parser.add_argument("--effects", nargs="*", default=[])
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument("--scales", type=float, nargs="+", default=[1, 2, 3], help="e.g. 1 2 3 (default)")
+    group.add_argument("--dpi", type=float, nargs="+", help=f"target DPIs; the base canvas is {BASE_DPI} DPI")
+    parser.add_argument("--compact", action="store_true", help="crop to the ink in the smallest exact mode")
+    parser.add_argument("-o", "--output", default="signature.png",
+                        help="base file name; the scale or DPI is appended (signature@2x.png)")
+    args = parser.parse_args(argv)
+
+    spec = make_spec(args.name, args.font, args.size, args.color, args.background, effects=args.effects)
+    root, ext = os.path.splitext(args.output)
+    for label, scale, dpi, data in export_scales(spec, args.scales, args.dpi, compact=args.compact):
+        path = f"{root}{label if label.startswith('@') else '_' + label}{ext or '.png'}"
+        with open(path, "wb") as f:
+            f.write(data)
+        print(f"Signature saved as {path} ({dpi:g} DPI, {len(data)} bytes)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
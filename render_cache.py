@@ -0,0 +1,200 @@
+import hashlib
+import io
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from PIL import Image
+from instrument import timed
+from renderer import render_signature, resolve_font_path
+
+# Two-tier cache of finished signatures, keyed by a stable hash of the render
+# spec plus the content hash of the font file:
+#   - memory: LRU of decoded images and/or PNG bytes under a byte budget
+#   - disk:   PNG files, evicted oldest-first once over a size budget
+# Cached images are shared between callers and must not be modified in place.
+
+_font_digests = {}
+
+
+def font_digest(font):
+    # Content hash of a font file, recomputed only when its mtime or size changes
+    path = resolve_font_path(font)
+    st = os.stat(path)
+    stamp = (st.st_mtime_ns, st.st_size)
+    cached = _font_digests.get(path)
+    if cached is None or cached[0] != stamp:
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                h.update(block)
+        cached = _font_digests[path] = (stamp, h.hexdigest())
+    return cached[1]
+
+
+def spec_key(spec):
+    fields = spec._asdict()
+    fields["font"] = font_digest(spec.font)
+    fields["effects"] = sorted(spec.effects)
+    fields["canvas"] = list(spec.canvas)
+    blob = json.dumps(fields, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+def encode_png(img):
+    with timed("encode_png") as span:
+        buf = io.BytesIO()
+        img.save(buf, "PNG")
+        span.add_bytes(buf.tell())
+    return buf.getvalue()
+
+
+def _image_bytes(img):
+    return img.size[0] * img.size[1] * len(img.getbands())
+
+
+class RenderCache:
+    def __init__(self, memory_bytes=64 << 20, disk_dir=None, disk_bytes=512 << 20, render=render_signature):
+        self.memory_bytes = memory_bytes
+        self.disk_dir = disk_dir
+        self.disk_bytes = disk_bytes
+        self.render = render
+        self._memory = OrderedDict()  # key -> [image or None, png or None, size]
+        self._memory_used = 0
+        self._disk_used = 0
+        self._lock = threading.RLock()
+        self.stats = {
+            "memory_hits": 0, "disk_hits": 0, "misses": 0,
+            "memory_evictions": 0, "disk_evictions": 0,
+        }
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+            self._disk_used = sum(size for _, size, _ in self._disk_entries())
+
+    def get_image(self, spec):
+        key = spec_key(spec)
+        with self._lock:
+            entry = self._memory_get(key)
+            if entry is not None:
+                self.stats["memory_hits"] += 1
+                if entry[0] is not None:
+                    return entry[0]
+            png = entry[1] if entry is not None else self._disk_get(key)
+            if png is not None:
+                img = Image.open(io.BytesIO(png))
+                img.load()
+                self._memory_put(key, img, png)
+                return img
+            self.stats["misses"] += 1
+        img = self.render(spec)
+        with self._lock:
+            self._memory_put(key, img, None)
+        return img
+
+    def get_png(self, spec):
+        # Hits return the stored bytes as-is, without decoding or re-encoding
+        key = spec_key(spec)
+        with self._lock:
+            entry = self._memory_get(key)
+            if entry is not None and entry[1] is not None:
+                self.stats["memory_hits"] += 1
+                return entry[1]
+            png = self._disk_get(key)
+            if png is not None:
+                self._memory_put(key, entry[0] if entry is not None else None, png)
+                return png
+            img = entry[0] if entry is not None else None
+            self.stats["memory_hits" if img is not None else "misses"] += 1
+        if img is None:
+            img = self.render(spec)
+        png = encode_png(img)
+        with self._lock:
+            self._memory_put(key, img, png)
+            self._disk_put(key, png)
+        return png
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            self._memory_used = 0
+
+    # --- Memory tier ---
+
+    def _memory_get(self, key):
+        entry = self._memory.get(key)
+        if entry is not None:
+            self._memory.move_to_end(key)
+        return entry
+
+    def _memory_put(self, key, img, png):
+        old = self._memory.pop(key, None)
+        if old is not None:
+            self._memory_used -= old[2]
+            img = img if img is not None else old[0]
+            png = png if png is not None else old[1]
+        size = (_image_bytes(img) if img is not None else 0) + (len(png) if png is not None else 0)
+        if size > self.memory_bytes:
+            return
+        self._memory[key] = [img, png, size]
+        self._memory_used += size
+        while self._memory_used > self.memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_used -= evicted[2]
+            self.stats["memory_evictions"] += 1
+
+    # --- Disk tier ---
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, key[:2], key + ".png")
+
+    def _disk_entries(self):
+        for sub in os.scandir(self.disk_dir):
+            if sub.is_dir():
+                for entry in os.scandir(sub.path):
+                    if entry.name.endswith(".png"):
+                        st = entry.stat()
+                        yield entry.path, st.st_size, st.st_mtime
+
+    def _disk_get(self, key):
+        if not self.disk_dir:
+            return None
+        path = self._disk_path(key)
+        try:
+            with open(path, "rb") as f:
+                png = f.read()
+            os.utime(path)  # mtime doubles as the LRU clock
+        except OSError:
+            return None
+        self.stats["disk_hits"] += 1
+        return png
+
+    def _disk_put(self, key, png):
+        if not self.disk_dir or len(png) > self.disk_bytes:
+            return
+        path = self._disk_path(key)
+        if os.path.exists(path):
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(png)
+        os.replace(tmp, path)
+        self._disk_used += len(png)
+        if self._disk_used > self.disk_bytes:
+            self._disk_evict()
+
+    def _disk_evict(self):
+        entries = sorted(self._disk_entries(), key=lambda e: e[2])
+        self._disk_used = sum(size for _, size, _ in entries)
+        # Evict down to 90% so we don't rescan on every put
+        target = self.disk_bytes * 0.9
+        for path, size, _ in entries:
+            if self._disk_used <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            self._disk_used -= size
+            self.stats["disk_evictions"] += 1
@@ -0,0 +1,192 @@
+import os
+from collections import namedtuple
+from functools import lru_cache
+from PIL import Image, ImageFont
+from effects import apply_effects, composite, text_mask
+from glyph_atlas import glyph_atlas
+from instrument import timed
+
+# Headless signature rendering shared by the GUI, the v1 script and batch tools.
+# Nothing in here touches Tk, so it can run in servers and worker processes.
+
+FONT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Font file placeholders (replace with your own .ttf paths)
+FONT_PATHS = {
+    "Font 1 (Great Vibes)": "GreatVibes-Regular.ttf",
+    "Font 2 (Alex-Brush)": "AlexBrush-Regular.ttf",
+    "Font 3 (DancingScript)": "DancingScript-VariableFont_wght.ttf",
+    "Font 4 (Allura)": "Allura-Regular.ttf",
+    "Font 5 (Parisienne)": "Parisienne-Regular.ttf",
+}
+
+DEFAULT_FONT = "Font 1 (Great Vibes)"
+CANVAS_SIZE = (900, 300)
+EFFECTS = ("bold", "shadow", "underline")
+
+# Maximum number of (path, size, axes) fonts kept loaded per process
+FONT_CACHE_SIZE = 64
+
+# Bold on a font with a weight axis renders this much heavier (clamped to the
+# axis) instead of dilating the text mask
+BOLD_WEIGHT_STEP = 300
+
+# Axis names as FreeType reports them, mapped to their OpenType tags
+AXIS_TAGS = {"Weight": "wght", "Width": "wdth", "Slant": "slnt", "Italic": "ital", "Optical size": "opsz"}
+
+# A plain, hashable description of one signature. `font` is a FONT_PATHS key
+# or a path to a .ttf file; `effects` is a frozenset of effect stage names
+# (EFFECTS are the ones the GUI offers, see effects.py for the rest); `axes`
+# holds sorted (tag, value) pairs for variable fonts, e.g. (("wght", 600.0),).
+RenderSpec = namedtuple(
+    "RenderSpec",
+    ["name", "font", "size", "color", "background", "effects", "canvas", "axes"],
+    defaults=[DEFAULT_FONT, 80, "#000000", "White", frozenset(), CANVAS_SIZE, ()],
+)
+
+
+def make_spec(name, font=DEFAULT_FONT, size=80, color="#000000", background="White",
+              bold=False, shadow=False, underline=False, canvas=CANVAS_SIZE, effects=(), axes=()):
+    effects = frozenset(effects) | {e for e, on in zip(EFFECTS, (bold, shadow, underline)) if on}
+    return RenderSpec(name, font, int(size), color, background, effects, tuple(canvas), axis_key(axes))
+
+
+def axis_key(axes):
+    # Normalizes a {tag: value} dict or (tag, value) pairs into sorted pairs
+    items = axes.items() if isinstance(axes, dict) else axes
+    return tuple(sorted((str(tag), float(value)) for tag, value in items))
+
+
+def resolve_font_path(font):
+    path = FONT_PATHS.get(font, font)
+    # Bundled fonts live next to this module, so don't depend on the cwd
+    if not os.path.isabs(path) and not os.path.exists(path):
+        bundled = os.path.join(FONT_DIR, path)
+        if os.path.exists(bundled):
+            return bundled
+    return path
+
+
+@lru_cache(maxsize=FONT_CACHE_SIZE)
+def _load_font(path, size, axes=()):
+    with timed("truetype"):
+        font = ImageFont.truetype(path, size)
+        if axes:
+            values = dict(axes)
+            font.set_variation_by_axes([min(high, max(low, values.get(tag, default)))
+                                        for tag, (low, default, high) in _font_axes(path).items()])
+        return font
+
+
+def load_font(font, size, axes=()):
+    # Raises OSError if the font can't be loaded; callers decide how to report it.
+    # Each axis configuration is its own cache entry, so switching back and
+    # forth between weights doesn't reload anything.
+    path = resolve_font_path(font)
+    axes = axis_key(axes)
+    if axes and not _font_axes(path):
+        axes = ()
+    return _load_font(path, int(size), axes)
+
+
+@lru_cache(maxsize=FONT_CACHE_SIZE)
+def _font_axes(path):
+    try:
+        axes = ImageFont.truetype(path, 10).get_variation_axes()
+    except OSError:  # not a variable font
+        return {}
+    out = {}
+    for axis in axes:
+        name = axis["name"].decode("utf-8", "replace") if isinstance(axis["name"], bytes) else axis["name"]
+        out[AXIS_TAGS.get(name, name.lower())] = (axis["minimum"], axis["default"], axis["maximum"])
+    return out
+
+
+def font_axes(font):
+    # {tag: (minimum, default, maximum)} of a variable font; empty for static fonts
+    return dict(_font_axes(resolve_font_path(font)))
+
+
+def render_instance(spec):
+    # The axis location a spec is drawn at and the effects left to apply:
+    # bold on a font with a weight axis becomes a heavier instance, not a
+    # dilation. Shared by render_font and the vector export.
+    axes = dict(spec.axes)
+    effects = spec.effects
+    weight = font_axes(spec.font).get("wght")
+    if "bold" in effects and weight is not None:
+        low, default, high = weight
+        current = min(high, max(low, axes.get("wght", default)))
+        if current < high:
+            axes["wght"] = min(high, current + BOLD_WEIGHT_STEP)
+            effects = effects - {"bold"}
+    return axis_key(axes), effects
+
+
+def render_font(spec):
+    # The font a spec is rasterized with and the effects left to apply
+    axes, effects = render_instance(spec)
+    return load_font(spec.font, spec.size, axes), effects
+
+
+def preload_fonts(sizes=(80,), fonts=None):
+    for font in fonts or FONT_PATHS:
+        for size in sizes:
+            load_font(font, size)
+
+
+def font_cache_info():
+    return _load_font.cache_info()
+
+
+def clear_font_cache():
+    _load_font.cache_clear()
+    _font_axes.cache_clear()
+
+
+def render_signature(spec, font=None, atlas=False, scale=1):
+    # `font` overrides the spec's font, e.g. with a fallback after a load error.
+    # With `atlas`, text is composed from cached glyph masks (see glyph_atlas.py).
+    # `scale` enlarges the font, canvas and effects together, for high-DPI output.
+    with timed("render"):
+        if scale != 1:
+            spec = scale_spec(spec, scale)
+        if font is None:
+            font, effects = render_font(spec)
+            spec = spec._replace(effects=effects)
+
+        width, height = spec.canvas
+        # Create image
+        with timed("canvas") as span:
+            img = Image.new("RGBA", (width, height), background_color(spec.background))
+            span.add_bytes(width * height * 4)
+
+        return composite(img, signature_layers(spec, font, atlas, scale))
+
+
+def scale_spec(spec, scale):
+    return spec._replace(size=max(1, round(spec.size * scale)),
+                         canvas=tuple(max(1, round(n * scale)) for n in spec.canvas))
+
+
+def background_color(background):
+    return (255, 255, 255, 0) if background == "Transparent" else (255, 255, 255, 255)
+
+
+def signature_layers(spec, font, atlas=False, scale=1):
+    # The colored mask layers of a signature in z order, before compositing
+    # Rasterize the name once; every effect is derived from this mask
+    with timed("mask") as span:
+        if atlas and isinstance(font, ImageFont.FreeTypeFont):
+            mask, offset = glyph_atlas(font).text_mask(spec.name)
+        else:
+            mask, offset = text_mask(font, spec.name)
+        span.add_bytes(mask.size[0] * mask.size[1])
+
+    # Center text
+    width, height = spec.canvas
+    text_width, text_height = mask.size
+    position = ((width - text_width) // 2, (height - text_height) // 2)
+    origin = (position[0] + offset[0], position[1] + offset[1])
+
+    return apply_effects(spec, mask, origin, (position[0], position[1], text_width, text_height), scale)
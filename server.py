@@ -0,0 +1,353 @@
+import argparse
+import asyncio
+import json
+import os
+import time
+from collections import deque
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import parse_qsl, urlsplit
+from PIL import ImageColor
+from batch import parse_axes, parse_effects
+from fontregistry import resolve_font, shared_registry
+from render_cache import RenderCache, spec_key
+from renderer import CANVAS_SIZE, DEFAULT_FONT, FONT_PATHS, make_spec, preload_fonts
+from workerpool import WarmPool, warm_render_path
+
+# Local HTTP rendering service on asyncio streams (stdlib only):
+#
+#   GET  /render?name=R.Maunick&font=Font+2+(Alex-Brush)&size=90&effects=bold,underline
+#   GET  /render?name=R.Maunick&font=Font+3+(DancingScript)&weight=600
+#   GET  /render?name=R.Maunick&font=Allura+Regular   (any font in the registry)
+#   POST /render   {"name": "R.Maunick", "size": "auto", "effects": ["shadow"]}
+#   GET  /health, GET /metrics
+#
+# Rendering runs on a process pool whose workers preload every font and keep
+# a RenderCache, so the event loop only parses requests and moves bytes.
+# Responses carry an ETag derived from the spec hash; requests with a matching
+# If-None-Match get a 304 without rendering. At most `max_in_flight` renders
+# are submitted at once and at most `max_queue` more may wait for a slot;
+# anything beyond that is rejected with 503 right away.
+#
+# With --warm-pool the workers are forked from a process that has already
+# loaded the fonts and rendered once (see workerpool.py), optionally recycled
+# after --max-tasks-per-child renders; /metrics then lists each worker's
+# render times and memory.
+#
+#   python server.py --port 8000 --workers 4
+
+MAX_HEADER_BYTES = 16 << 10
+MAX_BODY_BYTES = 64 << 10
+MAX_SIZE = 1000
+MAX_CANVAS = 4000
+LATENCY_SAMPLES = 2048
+
+_worker_cache = None
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def _init_worker(sizes, cache_bytes):
+    global _worker_cache
+    preload_fonts(sizes)
+    _worker_cache = RenderCache(memory_bytes=cache_bytes)
+
+
+def _render_png(spec):
+    # Runs in a worker process; a size of "auto" is fitted here since it is CPU work
+    if spec.size == "auto":
+        from autofit import fit_size
+        spec = spec._replace(size=fit_size(spec.name, spec.font, spec.canvas, spec.effects, axes=spec.axes))
+    return _worker_cache.get_png(spec)
+
+
+def _warm():
+    return os.getpid()
+
+
+def _param(params, key, default, types=(str,)):
+    # A parameter, `default` if it is absent, null or "", or a 400 for the
+    # wrong JSON type (bool is not a number)
+    value = params.get(key)
+    if value is None or value == "":
+        return default
+    if not isinstance(value, types) or isinstance(value, bool):
+        raise ValueError(f"{key} has the wrong type")
+    return value
+
+
+def parse_spec(params):
+    # Builds a RenderSpec from query parameters or a JSON object; size may be "auto"
+    try:
+        name = _param(params, "name", "").strip()
+        if not name:
+            raise ValueError("missing name")
+        font = resolve_font(_param(params, "font", DEFAULT_FONT))
+        background = _param(params, "background", "White")
+        if background not in ("White", "Transparent"):
+            raise ValueError(f"unknown background: {background}")
+        effects = _param(params, "effects", [], (str, list))
+        if isinstance(effects, list) and not all(isinstance(effect, str) for effect in effects):
+            raise ValueError("effects must be strings")
+        effects = parse_effects(effects)
+        axes = _param(params, "axes", None, (str, dict))
+        axes = parse_axes(axes, _param(params, "weight", None, (str, int, float)))
+        size = _param(params, "size", 80, (str, int))
+        auto = isinstance(size, str) and size.strip().lower() == "auto"
+        canvas = _param(params, "canvas", CANVAS_SIZE, (str, list))
+        if isinstance(canvas, str):
+            canvas = canvas.lower().replace("x", ",").split(",")
+        if len(canvas) != 2 or not all(isinstance(n, (str, int)) and not isinstance(n, bool) for n in canvas):
+            raise ValueError("canvas must be two integers")
+        spec = make_spec(name, font, 80 if auto else size, _param(params, "color", "#000000"),
+                         background, effects=effects, canvas=map(int, canvas), axes=axes)
+        ImageColor.getrgb(spec.color)
+    except (TypeError, ValueError) as e:
+        raise HTTPError(400, str(e))
+    if not 1 <= spec.size <= MAX_SIZE or not all(1 <= n <= MAX_CANVAS for n in spec.canvas):
+        raise HTTPError(400, "size or canvas out of range")
+    return spec._replace(size="auto") if auto else spec
+
+
+class SignatureServer:
+    def __init__(self, workers=None, max_in_flight=None, max_queue=None, preload_sizes=(80,),
+                 cache_bytes=64 << 20, warm_pool=False, max_tasks_per_child=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.max_in_flight = max_in_flight or self.workers * 2
+        self.max_queue = self.max_in_flight * 4 if max_queue is None else max_queue
+        initargs = (tuple(preload_sizes), cache_bytes)
+        if warm_pool:
+            self.pool = WarmPool(self.workers, max_tasks_per_child, warm=partial(warm_render_path, tuple(preload_sizes)),
+                                 initializer=_init_worker, initargs=initargs)
+        else:
+            self.pool = ProcessPoolExecutor(self.workers, initializer=_init_worker, initargs=initargs)
+        self._slots = asyncio.Semaphore(self.max_in_flight)
+        self._pending = {}  # etag -> future of a render in progress, shared by duplicates
+        self.in_flight = 0
+        self.queued = 0
+        self.started = time.time()
+        self.latencies = deque(maxlen=LATENCY_SAMPLES)
+        self.counters = {"requests": 0, "renders": 0, "coalesced": 0, "not_modified": 0,
+                         "rejected": 0, "errors": 0}
+        self.statuses = {}
+
+    async def warm(self):
+        # Start every worker (and so preload its fonts) before taking traffic
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, shared_registry)  # index the fonts parse_spec resolves names against
+        await asyncio.gather(*(loop.run_in_executor(self.pool, _warm) for _ in range(self.workers)))
+
+    def close(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+    # --- Rendering ---
+
+    async def render(self, spec, etag):
+        future = self._pending.get(etag)
+        if future is not None:
+            self.counters["coalesced"] += 1
+            return await asyncio.shield(future)
+        if self.in_flight >= self.max_in_flight and self.queued >= self.max_queue:
+            self.counters["rejected"] += 1
+            raise HTTPError(503, "server busy")
+        future = self._pending[etag] = asyncio.get_running_loop().create_future()
+        try:
+            self.queued += 1
+            try:
+                await self._slots.acquire()
+            finally:
+                self.queued -= 1
+            self.in_flight += 1
+            try:
+                png = await asyncio.get_running_loop().run_in_executor(self.pool, _render_png, spec)
+            finally:
+                self.in_flight -= 1
+                self._slots.release()
+            self.counters["renders"] += 1
+            future.set_result(png)
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()  # retrieved here; waiters re-raise it
+            raise
+        finally:
+            del self._pending[etag]
+        return png
+
+    # --- HTTP ---
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                request = await self._read_request(reader)
+                if request is None:
+                    break
+                method, target, headers, body = request
+                start = time.perf_counter()
+                self.counters["requests"] += 1
+                try:
+                    status, response_headers, payload = await self.dispatch(method, target, headers, body)
+                except HTTPError as e:
+                    status, response_headers, payload = e.status, {"Content-Type": "application/json"}, \
+                        json.dumps({"error": str(e)}).encode()
+                    if status == 503:
+                        response_headers["Retry-After"] = "1"
+                except Exception as e:
+                    self.counters["errors"] += 1
+                    status, response_headers, payload = 500, {"Content-Type": "application/json"}, \
+                        json.dumps({"error": f"{type(e).__name__}: {e}"}).encode()
+                keep_alive = headers.get("connection", "").lower() != "close"
+                self._write_response(writer, status, response_headers, payload, keep_alive, method == "HEAD")
+                await writer.drain()
+                self.statuses[status] = self.statuses.get(status, 0) + 1
+                self.latencies.append(time.perf_counter() - start)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except HTTPError as e:
+            self._write_response(writer, e.status, {}, str(e).encode(), False, False)
+        finally:
+            writer.close()
+
+    async def _read_request(self, reader):
+        try:
+            head = await reader.readuntil(b"\r\n\r\n")
+        except asyncio.IncompleteReadError:
+            return None
+        except asyncio.LimitOverrunError:
+            raise HTTPError(431, "request header too large")
+        lines = head.decode("latin-1").split("\r\n")
+        try:
+            method, target, _ = lines[0].split(" ", 2)
+        except ValueError:
+            raise HTTPError(400, "bad request line")
+        headers = {}
+        for line in lines[1:]:
+            if ":" in line:
+                key, value = line.split(":", 1)
+                headers[key.strip().lower()] = value.strip()
+        length = headers.get("content-length") or "0"
+        # Digits only: int() would also take signs, spaces and underscores
+        if not (length.isascii() and length.isdigit()):
+            raise HTTPError(400, "bad Content-Length")
+        length = int(length)
+        if length > MAX_BODY_BYTES:
+            raise HTTPError(413, "request body too large")
+        body = await reader.readexactly(length) if length else b""
+        return method.upper(), target, headers, body
+
+    def _write_response(self, writer, status, headers, payload, keep_alive, head_only):
+        reason = {200: "OK", 304: "Not Modified", 400: "Bad Request", 404: "Not Found",
+                  405: "Method Not Allowed", 413: "Payload Too Large", 431: "Request Header Fields Too Large",
+                  500: "Internal Server Error", 503: "Service Unavailable"}.get(status, "")
+        lines = [f"HTTP/1.1 {status} {reason}"]
+        headers = dict(headers)
+        if status != 304:
+            headers["Content-Length"] = str(len(payload))
+        headers["Connection"] = "keep-alive" if keep_alive else "close"
+        lines += [f"{key}: {value}" for key, value in headers.items()]
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+        if status != 304 and not head_only:
+            writer.write(payload)
+
+    async def dispatch(self, method, target, headers, body):
+        url = urlsplit(target)
+        if url.path == "/render":
+            if method in ("GET", "HEAD"):
+                params = dict(parse_qsl(url.query))
+            elif method == "POST":
+                try:
+                    params = json.loads(body or b"{}")
+                except ValueError as e:
+                    raise HTTPError(400, f"invalid JSON: {e}")
+                if not isinstance(params, dict):
+                    raise HTTPError(400, "expected a JSON object")
+            else:
+                raise HTTPError(405, "use GET or POST")
+            return await self.render_response(parse_spec(params), headers)
+        if method not in ("GET", "HEAD"):
+            raise HTTPError(405, "use GET")
+        if url.path == "/health":
+            return 200, {"Content-Type": "application/json"}, json.dumps(
+                {"status": "ok", "workers": self.workers, "fonts": len(FONT_PATHS)}).encode()
+        if url.path == "/metrics":
+            return 200, {"Content-Type": "application/json"}, json.dumps(self.metrics()).encode()
+        raise HTTPError(404, "not found")
+
+    async def render_response(self, spec, headers):
+        etag = f'"{spec_key(spec)}"'
+        response_headers = {"ETag": etag, "Cache-Control": "public, max-age=86400"}
+        match = headers.get("if-none-match", "")
+        if match == "*" or etag in (tag.strip() for tag in match.split(",")):
+            self.counters["not_modified"] += 1
+            return 304, response_headers, b""
+        png = await self.render(spec, etag)
+        response_headers["Content-Type"] = "image/png"
+        return 200, response_headers, png
+
+    def metrics(self):
+        latencies = sorted(self.latencies)
+
+        def percentile(p):
+            return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000, 3) if latencies else None
+
+        out = {
+            **self.counters,
+            "statuses": {str(status): count for status, count in sorted(self.statuses.items())},
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "max_in_flight": self.max_in_flight,
+            "max_queue": self.max_queue,
+            "workers": self.workers,
+            "uptime_seconds": round(time.time() - self.started, 1),
+            "latency_ms": {"p50": percentile(0.5), "p95": percentile(0.95), "p99": percentile(0.99)},
+        }
+        if isinstance(self.pool, WarmPool):
+            out["worker_processes"] = self.pool.worker_stats()
+        return out
+
+
+async def serve(host="127.0.0.1", port=8000, **options):
+    app = SignatureServer(**options)
+    try:
+        await app.warm()
+        server = await asyncio.start_server(app.handle, host, port, limit=MAX_HEADER_BYTES, backlog=1024)
+        print(f"Serving signatures on http://{host}:{port}/render ({app.workers} workers)")
+        async with server:
+            await server.serve_forever()
+    finally:
+        app.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve signature PNGs over HTTP.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=None, help="render processes (default: CPU count)")
+    parser.add_argument("--max-in-flight", type=int, default=None,
+                        help="renders submitted to the pool at once (default: 2 per worker)")
+    parser.add_argument("--max-queue", type=int, default=None,
+                        help="requests that may wait for a render slot before 503s (default: 4x max-in-flight)")
+    parser.add_argument("--preload-sizes", type=lambda s: tuple(int(x) for x in s.split(",")), default=(80,),
+                        help="comma-separated font sizes to preload in every worker")
+    parser.add_argument("--warm-pool", action="store_true",
+                        help="fork workers from a process with the fonts already loaded")
+    parser.add_argument("--max-tasks-per-child", type=int, default=None, metavar="N",
+                        help="with --warm-pool, replace each worker after N renders")
+    args = parser.parse_args(argv)
+    if args.max_tasks_per_child and not args.warm_pool:
+        parser.error("--max-tasks-per-child requires --warm-pool")
+    try:
+        asyncio.run(serve(args.host, args.port, workers=args.workers, max_in_flight=args.max_in_flight,
+                          max_queue=args.max_queue, preload_sizes=args.preload_sizes,
+                          warm_pool=args.warm_pool, max_tasks_per_child=args.max_tasks_per_child))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
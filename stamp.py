@@ -0,0 +1,292 @@
+import argparse
+import os
+import sys
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from functools import lru_cache
+from PIL import Image, ImageChops
+from instrument import timed
+from multires import BASE_DPI
+from renderer import DEFAULT_FONT, FONT_PATHS, make_spec, render_signature
+
+# Stamping signatures onto document page images (scans as TIFF, PNG, JPEG...).
+# The signature is turned into a premultiplied-alpha overlay once per scale
+# and page mode: the premultiplied ink S·a and the inverse coverage 255 - a.
+# Stamping a page is then two operations on the destination region only,
+#   region = region · (255 - a) / 255 + S·a
+# so the rest of the page is never touched. A signature saved on a white
+# background is premultiplied directly (white is ink-free), so it stamps like
+# ink instead of as a white box.
+#
+# Pages are processed on a thread pool (Pillow releases the GIL while decoding,
+# compositing and encoding) with a bounded number in flight. Pages are opened
+# lazily, and uncompressed TIFFs are memory-mapped by Pillow; multi-page files
+# are decoded one frame at a time and only the chosen page is stamped.
+#
+#   python stamp.py scans/*.tif --name "R.Maunick" --at -150 -120 -o stamped/
+#   python stamp.py --jobs stamps.csv --signature signature.png
+#
+# Positions are in page pixels from the top-left corner; a negative x or y
+# places the signature's right or bottom edge that far from the page edge.
+
+StampJob = namedtuple("StampJob", ["input", "output", "x", "y", "scale", "page", "error"],
+                      defaults=[-100, -100, 1.0, -1, None])
+
+# Page modes stamped as they are; others are converted to RGB first
+PAGE_MODES = ("1", "L", "RGB", "RGBA")
+SAVE_ALL_FORMATS = ("TIFF", "PDF", "GIF", "WEBP", "PNG")
+
+
+def _premultiplied(img):
+    # RGBA or opaque-on-white signature -> "RGBa" (premultiplied) image
+    img = img.convert("RGBA")
+    if img.getextrema()[3][0] < 255:
+        return img.convert("RGBa")
+    # Opaque on white: coverage is how far the darkest channel is from
+    # white, and S·a = pixel - (255 - a) per channel
+    bands = img.split()[:3]
+    darkest = ImageChops.darker(ImageChops.darker(bands[0], bands[1]), bands[2])
+    return Image.merge("RGBa", [ImageChops.subtract(band, darkest) for band in bands] + [ImageChops.invert(darkest)])
+
+
+class Overlay:
+    def __init__(self, image=None, spec=None):
+        # From a rendered signature image, or from a RenderSpec, which is
+        # re-rendered at each scale instead of resampled
+        if (image is None) == (spec is None):
+            raise ValueError("pass either an image or a spec")
+        self.spec = spec._replace(background="Transparent") if spec is not None else None
+        self.image = None if image is None else self._crop(_premultiplied(image))
+        self._scaled = lru_cache(maxsize=16)(self._scale)
+        self.prepared = lru_cache(maxsize=32)(self._prepare)
+
+    @staticmethod
+    def _crop(pm):
+        bbox = pm.split()[3].getbbox()
+        return pm.crop(bbox) if bbox else pm.crop((0, 0, 1, 1))
+
+    def _scale(self, scale):
+        if self.spec is not None:
+            return self._crop(render_signature(self.spec, scale=scale).convert("RGBa"))
+        if scale == 1:
+            return self.image
+        size = tuple(max(1, round(n * scale)) for n in self.image.size)
+        # Resampling premultiplied values keeps edges free of dark or light fringes
+        return self.image.resize(size, Image.LANCZOS)
+
+    def _prepare(self, scale, mode):
+        # (ink, inverse coverage) in `mode` ("L" or "RGB"), or the straight
+        # RGBA overlay (and None) for pages with alpha
+        with timed("stamp.prepare"):
+            pm = self._scaled(scale)
+            if mode == "RGBA":
+                return pm.convert("RGBA"), None
+            bands = pm.split()
+            inverse = ImageChops.invert(bands[3])
+            ink = Image.merge("RGB", bands[:3])
+            if mode == "L":
+                return ink.convert("L"), inverse
+            return ink, Image.merge("RGB", (inverse,) * 3)
+
+    def is_gray(self, scale=1.0):
+        r, g, b, _ = self._scaled(scale).split()
+        return ImageChops.lighter(ImageChops.difference(r, g), ImageChops.difference(g, b)).getbbox() is None
+
+    def size(self, scale):
+        return self._scaled(scale).size
+
+
+def _place(page_size, overlay_size, x, y):
+    # Visible destination box and the matching box within the overlay, or None
+    left = x if x >= 0 else page_size[0] + x - overlay_size[0]
+    top = y if y >= 0 else page_size[1] + y - overlay_size[1]
+    box = (max(left, 0), max(top, 0),
+           min(left + overlay_size[0], page_size[0]), min(top + overlay_size[1], page_size[1]))
+    if box[0] >= box[2] or box[1] >= box[3]:
+        return None
+    return box, (box[0] - left, box[1] - top, box[2] - left, box[3] - top)
+
+
+def stamp_image(page, overlay, x=-100, y=-100, scale=1.0):
+    # Stamps the overlay onto `page` in place and returns it; pages in modes
+    # other than PAGE_MODES (and gray pages for colored ink) are converted
+    # first, so the result may be a new image
+    if page.mode not in PAGE_MODES or (page.mode == "L" and not overlay.is_gray(scale)):
+        page = page.convert("RGBA" if "A" in page.getbands() or "transparency" in page.info else "RGB")
+    placed = _place(page.size, overlay.size(scale), x, y)
+    if placed is None:
+        return page
+    box, source = placed
+    with timed("stamp.composite") as span:
+        if page.mode == "RGBA":
+            straight, _ = overlay.prepared(scale, "RGBA")
+            page.alpha_composite(straight, box[:2], source)
+        else:
+            ink, inverse = overlay.prepared(scale, "RGB" if page.mode == "RGB" else "L")
+            region = page.crop(box)
+            if page.mode == "1":
+                region = region.convert("L")
+            region = ImageChops.add(ImageChops.multiply(region, inverse.crop(source)), ink.crop(source))
+            if page.mode == "1":
+                region = region.convert("1", dither=Image.Dither.NONE)
+            page.paste(region, box)
+        span.add_bytes((box[2] - box[0]) * (box[3] - box[1]) * len(page.getbands()))
+    return page
+
+
+def page_scale(value, page):
+    # A job's scale: a number, or "dpi" for the page's DPI relative to BASE_DPI
+    if isinstance(value, str) and value.strip().lower() == "dpi":
+        dpi = page.info.get("dpi")
+        return float(dpi[0]) / BASE_DPI if dpi and dpi[0] else 1.0
+    return float(value or 1.0)
+
+
+def _save_options(src, fmt, mode):
+    options = {}
+    dpi = src.info.get("dpi")
+    if fmt == "TIFF":
+        compression = src.info.get("compression")
+        if compression in ("group3", "group4") and mode != "1":
+            compression = "tiff_adobe_deflate"
+        if compression and compression != "raw":
+            options["compression"] = compression
+    elif fmt == "JPEG":
+        options["quality"] = 95
+    elif fmt == "PDF" and dpi:
+        options["resolution"] = float(dpi[0])
+    if dpi and fmt != "PDF":
+        options["dpi"] = dpi
+    return options
+
+
+def stamp_file(job, overlay):
+    # Stamps page `job.page` (negative counts from the end) of `job.input`
+    # and writes every page to `job.output`; `job.error` (a row that could
+    # not be read) fails the job instead
+    if job.error is not None:
+        raise ValueError(job.error)
+    with timed("stamp.page"), Image.open(job.input) as src:
+        frames = getattr(src, "n_frames", 1)
+        index = job.page % frames
+        ext = os.path.splitext(job.output)[1].lower()
+        fmt = Image.registered_extensions().get(ext, src.format)
+        os.makedirs(os.path.dirname(job.output) or ".", exist_ok=True)
+        if frames == 1 or fmt not in SAVE_ALL_FORMATS:
+            src.seek(index)
+            page = stamp_image(src, overlay, int(job.x), int(job.y), page_scale(job.scale, src))
+            with timed("stamp.save"):
+                page.save(job.output, fmt, **_save_options(src, fmt, page.mode))
+            return
+        pages = []
+        for i in range(frames):
+            src.seek(i)
+            page = src.copy()
+            if i == index:
+                page = stamp_image(page, overlay, int(job.x), int(job.y), page_scale(job.scale, src))
+            pages.append(page)
+        with timed("stamp.save"):
+            pages[0].save(job.output, fmt, save_all=True, append_images=pages[1:],
+                          **_save_options(src, fmt, pages[index].mode))
+
+
+def stamp_pages(jobs, overlay, workers=None, max_pending=None):
+    # Yields (job, error or None) as pages finish. At most `max_pending` pages
+    # are open at once, so memory stays flat however many jobs there are.
+    workers = workers or os.cpu_count() or 1
+    max_pending = max_pending or workers * 2
+    pending = {}
+
+    def finished(done):
+        for future in done:
+            job = pending.pop(future)
+            error = future.exception()
+            yield job, None if error is None else f"{type(error).__name__}: {error}"
+
+    with ThreadPoolExecutor(workers) as pool:
+        for job in jobs:
+            if len(pending) >= max_pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                yield from finished(done)
+            pending[pool.submit(stamp_file, job, overlay)] = job
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            yield from finished(done)
+
+
+def _field(row, key, default):
+    # A row's value, or `default` when it is absent or blank (0 is a value)
+    value = row.get(key)
+    if value is None or (isinstance(value, str) and not value.strip()):
+        return default
+    return value
+
+
+def read_jobs(path, output_dir=".", defaults=StampJob(None, None)):
+    # StampJobs from a CSV/JSONL file with input, output, x, y, scale, page.
+    # A row that cannot be read becomes a job carrying its error, so it is
+    # reported as a failed page instead of ending the run.
+    from batch import read_rows
+
+    for number, row in read_rows(path):
+        source = str(_field(row, "input", path))
+        try:
+            if "_error" in row:
+                raise ValueError(row["_error"])
+            if _field(row, "input", None) is None:
+                raise ValueError("missing input")
+            output = str(_field(row, "output", os.path.basename(source)))
+            job = StampJob(source, os.path.join(output_dir, output),
+                           int(_field(row, "x", defaults.x)), int(_field(row, "y", defaults.y)),
+                           _field(row, "scale", defaults.scale), int(_field(row, "page", defaults.page)))
+        except (TypeError, ValueError) as e:
+            job = defaults._replace(input=source, output=None, error=f"row {number}: {e}")
+        yield job
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Stamp a signature onto document page images.")
+    parser.add_argument("pages", nargs="*", help="page images (or use --jobs)")
+    parser.add_argument("--jobs", metavar="FILE", help="CSV/JSONL with input, output, x, y, scale, page per row")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--signature", metavar="PNG", help="a saved signature (transparent or on white)")
+    source.add_argument("--name", help="render this name as the signature")
+    parser.add_argument("--font", default=DEFAULT_FONT, choices=list(FONT_PATHS))
+    parser.add_argument("--size", type=int, default=80)
+    parser.add_argument("--color", default="#000000")
+    parser.add_argument("--effects", nargs="*", default=[])
+    parser.add_argument("--at", type=int, nargs=2, default=(-100, -100), metavar=("X", "Y"),
+                        help="position in page pixels; negative values measure from the right/bottom edge")
+    parser.add_argument("--scale", default="1", help="overlay scale, or 'dpi' for page DPI / %d" % BASE_DPI)
+    parser.add_argument("--page", type=int, default=-1, help="page of multi-page files to stamp (default: last)")
+    parser.add_argument("-o", "--output-dir", default="stamped")
+    parser.add_argument("--workers", type=int, default=None, help="pages stamped in parallel (default: CPU count)")
+    args = parser.parse_args(argv)
+    if not args.pages and not args.jobs:
+        parser.error("give page images or --jobs")
+
+    if args.signature:
+        with Image.open(args.signature) as img:
+            overlay = Overlay(img)
+    else:
+        overlay = Overlay(spec=make_spec(args.name, args.font, args.size, args.color, effects=args.effects))
+    defaults = StampJob(None, None, args.at[0], args.at[1], args.scale, args.page)
+    if args.jobs:
+        jobs = read_jobs(args.jobs, args.output_dir, defaults)
+    else:
+        jobs = (defaults._replace(input=path, output=os.path.join(args.output_dir, os.path.basename(path)))
+                for path in args.pages)
+
+    stamped = failed = 0
+    for job, error in stamp_pages(jobs, overlay, args.workers):
+        if error is None:
+            stamped += 1
+        else:
+            failed += 1
+            print(f"{job.input}: {error}", file=sys.stderr)
+    print(f"Stamped {stamped} pages, {failed} failed")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
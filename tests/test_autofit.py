@@ -0,0 +1,32 @@
+import pytest
+from autofit import MARGIN, MAX_SIZE, MIN_SIZE, _Fitter, fit_size, fit_sizes
+from renderer import FONT_PATHS, clear_font_cache, load_font
+
+CASES = [
+    ("Font 3 (DancingScript)", (400, 150), ("shadow",), "-rZqKoH t"),  # fits at 73 and 75, not 74
+    ("Font 1 (Great Vibes)", (600, 200), (), "R.Maunick"),
+    ("Font 1 (Great Vibes)", (600, 200), ("glow", "underline"), "QUi"),  # fits at 107 and 110
+    ("Font 2 (Alex-Brush)", (600, 200), ("bold", "underline"), "Wolfgang Amadeus Mozart"),
+    ("Font 4 (Allura)", (300, 100), ("glow",), "Al"),
+    ("Font 5 (Parisienne)", (800, 300), (), "Jane Q. Public"),
+]
+
+
+@pytest.mark.parametrize("font, canvas, effects, name", CASES)
+def test_fit_is_the_largest_size_that_fits(font, canvas, effects, name):
+    fitter = _Fitter(font, canvas, effects, MARGIN, MIN_SIZE, MAX_SIZE)
+    fitting = [size for size in range(MIN_SIZE, MAX_SIZE + 1) if fitter.fits(name, size)]
+    assert fitter.fit(name) == max(fitting, default=MIN_SIZE)
+
+
+def test_fit_sizes_matches_fit_size():
+    names = [name for _, _, _, name in CASES]
+    font = next(iter(FONT_PATHS))
+    assert fit_sizes(names, font) == [fit_size(name, font) for name in names]
+
+
+def test_fitting_builds_no_glyph_atlas():
+    clear_font_cache()
+    font = next(iter(FONT_PATHS))
+    size = fit_size("Wolfgang Amadeus Mozart", font)
+    assert not hasattr(load_font(font, size), "_glyph_atlas")
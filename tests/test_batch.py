@@ -0,0 +1,50 @@
+import pytest
+from batch import BatchOptions, run_batch
+from instrument import StageStats, instrumented, timed
+
+
+def test_trace_leaves_out_warm_up(tmp_path):
+    rows = [(1, {"name": "Ana", "output": "ana.png"})]
+    with instrumented(StageStats()) as stats:
+        result = run_batch(rows, BatchOptions(str(tmp_path), trace=True), workers=1, warm_pool=True)
+    assert result["rendered"] == 1
+    # The warm-up renders every font twice; only the row's one render is traced
+    assert stats.stages["composite"]["count"] == 1
+
+
+def test_suspended_hooks_come_back():
+    from instrument import suspended
+
+    with instrumented(StageStats()) as stats:
+        with suspended():
+            with timed("hidden"):
+                pass
+        with timed("seen"):
+            pass
+    assert list(stats.stages) == ["seen"]
+
+
+def test_first_result_is_one_row_not_the_whole_chunk(tmp_path):
+    rows = [(i, {"name": f"Row {i}", "output": f"{i}.png", "effects": "shadow"}) for i in range(16)]
+    result = run_batch(rows, BatchOptions(str(tmp_path)), workers=1, chunk_size=16, warm_pool=True)
+    [worker] = result["workers"]
+    assert worker["tasks"] == 1
+    assert worker["first_result_ms"] < worker["total_task_ms"] / 4
+
+
+def test_manifest_never_copies_from_a_row_in_flight(tmp_path):
+    from manifest import Manifest
+    from PIL import Image, ImageChops
+
+    def run(rows):
+        with Manifest(str(tmp_path / "manifest.db")) as manifest:
+            return run_batch(list(enumerate(rows)), BatchOptions(str(tmp_path)), workers=1, chunk_size=1,
+                             manifest=manifest)
+
+    run([{"name": "Ana", "output": "a.png"}])
+    # a.png is re-rendered as "Bea" while "Ana" is wanted again for b.png:
+    # b.png must not be copied from a.png, whose chunk is still in flight
+    stats = run([{"name": "Bea", "output": "a.png"}, {"name": "Ana", "output": "b.png"}])
+    assert (stats["rendered"], stats["reused"]) == (2, 0)
+    a, b = (Image.open(tmp_path / name) for name in ("a.png", "b.png"))
+    assert ImageChops.difference(a.convert("RGB"), b.convert("RGB")).getbbox() is not None
@@ -0,0 +1,28 @@
+import shutil
+
+import pytest
+from fontregistry import FontRegistry, resolve_font
+from renderer import FONT_DIR, FONT_PATHS, resolve_font_path
+
+pytest.importorskip("fontTools")
+
+
+@pytest.fixture
+def registry(tmp_path):
+    shutil.copy(resolve_font_path(FONT_PATHS["Font 4 (Allura)"]), tmp_path / "Extra.ttf")
+    return FontRegistry([FONT_DIR, str(tmp_path)], str(tmp_path / "index.json")).load()
+
+
+@pytest.mark.parametrize("name", ["Font 4 (Allura)", "Allura Regular", "allura-regular", "Allura-Regular.ttf"])
+def test_bundled_fonts_resolve_to_their_key(registry, name):
+    assert resolve_font(name, registry) == "Font 4 (Allura)"
+
+
+def test_other_indexed_fonts_resolve_to_their_path(registry, tmp_path):
+    assert resolve_font("extra.ttf", registry) == str(tmp_path / "Extra.ttf")
+
+
+@pytest.mark.parametrize("name", ["Comic Sans", "../Allura-Regular.ttf.bak", ""])
+def test_unknown_fonts_are_rejected(registry, name):
+    with pytest.raises(ValueError, match="unknown font"):
+        resolve_font(name, registry)
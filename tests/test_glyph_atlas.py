@@ -0,0 +1,57 @@
+import gc
+import weakref
+import pytest
+from PIL import Image, ImageChops, ImageDraw
+from glyph_atlas import glyph_atlas as atlas_for
+from renderer import FONT_CACHE_SIZE, FONT_PATHS, clear_font_cache, load_font
+
+NAMES = ("R.Maunick", "Jane Q. Public", "Wolfgang Amadeus Mozart", "Zoë Ångström-Núñez")
+# FreeType rounds a whole line and single glyphs slightly differently
+TOLERANCE = 2
+
+
+@pytest.mark.parametrize("size", [30, 80, 150])
+@pytest.mark.parametrize("font_key", list(FONT_PATHS))
+def test_atlas_matches_draw_text(font_key, size):
+    font = load_font(font_key, size)
+    for name in NAMES:
+        bbox = font.getbbox(name)
+        canvas = (bbox[2] + 10, bbox[3] + 10)
+        expected = Image.new("L", canvas)
+        ImageDraw.Draw(expected).text((5, 5), name, fill=255, font=font)
+        mask, (dx, dy) = atlas_for(font).text_mask(name)
+        actual = Image.new("L", canvas)
+        ImageDraw.Draw(actual).bitmap((5 + dx, 5 + dy), mask, fill=255)
+        assert ImageChops.difference(expected, actual).getextrema()[1] <= TOLERANCE, name
+
+
+def test_atlas_bbox_matches_font():
+    font = load_font(next(iter(FONT_PATHS)), 80)
+    for name in NAMES + ("a b",):
+        assert atlas_for(font).bbox(name) == font.getbbox(name)
+
+
+def test_atlases_are_freed_with_their_fonts():
+    clear_font_cache()
+    gc.collect()
+    font_key = next(iter(FONT_PATHS))
+    atlases = []
+    for size in range(20, 20 + FONT_CACHE_SIZE * 3):
+        atlas = atlas_for(load_font(font_key, size))
+        atlas.text_mask("Signature")
+        atlases.append(weakref.ref(atlas))
+    del atlas
+    gc.collect()
+    # Fonts evicted from the renderer's LRU take their atlases with them
+    assert sum(ref() is not None for ref in atlases) <= FONT_CACHE_SIZE
+    clear_font_cache()
+    gc.collect()
+    assert all(ref() is None for ref in atlases)
+
+
+def test_atlas_keeps_its_font_usable():
+    clear_font_cache()
+    atlas = atlas_for(load_font(next(iter(FONT_PATHS)), 80))
+    clear_font_cache()
+    gc.collect()
+    assert atlas.bbox("Signature") == atlas.font.getbbox("Signature")
@@ -0,0 +1,37 @@
+import pytest
+from server import HTTPError, parse_spec
+
+
+@pytest.mark.parametrize("params", [
+    {"name": "Ana", "font": ["a"]},
+    {"name": "Ana", "axes": 5},
+    {"name": "Ana", "effects": [1]},
+    {"name": 5},
+    {"name": "Ana", "size": 0},
+    {"name": "Ana", "size": True},
+    {"name": "Ana", "size": 1.5},
+    {"name": "Ana", "canvas": [300]},
+    {"name": "Ana", "canvas": [300, {}]},
+    {"name": "Ana", "weight": [600]},
+    {"name": "Ana", "color": "not a color"},
+])
+def test_bad_specs_are_400(params):
+    with pytest.raises(HTTPError) as error:
+        parse_spec(params)
+    assert error.value.status == 400
+
+
+def test_query_and_json_specs():
+    assert parse_spec({"name": "Ana", "size": "90", "effects": "bold,shadow", "canvas": "300x100"}).size == 90
+    spec = parse_spec({"name": "Ana", "size": 90, "effects": ["bold"], "canvas": [300, 100], "weight": 600,
+                       "font": "Font 3 (DancingScript)"})
+    assert (spec.size, spec.canvas, spec.axes) == (90, (300, 100), (("wght", 600.0),))
+    assert parse_spec({"name": "Ana", "size": "auto"}).size == "auto"
+    assert parse_spec({"name": "Ana", "size": ""}).size == 80
+
+
+def test_fonts_resolve_through_the_registry():
+    pytest.importorskip("fontTools")
+    assert parse_spec({"name": "Ana", "font": "Dancing Script Regular"}).font == "Font 3 (DancingScript)"
+    with pytest.raises(HTTPError):
+        parse_spec({"name": "Ana", "font": "Comic Sans"})
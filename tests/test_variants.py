@@ -0,0 +1,32 @@
+import sys
+from itertools import product
+import pytest
+from effects import available_effects
+from renderer import FONT_PATHS, make_spec, render_signature
+from variants import render_variants
+
+COLORS = ("#000000", "#1a237e", "#c62828", "gray", "white")
+VARIANTS = list(product(COLORS, ("White", "Transparent")))
+EFFECT_SETS = [()] + [(effect,) for effect in available_effects()] + [("bold", "shadow", "underline"), ("glow", "outline")]
+
+
+def _assert_matches_individual_renders(font, size, name):
+    for effects in EFFECT_SETS:
+        spec = make_spec(name, font, size, effects=effects)
+        for (color, background), img in zip(VARIANTS, render_variants(spec, VARIANTS)):
+            expected = render_signature(spec._replace(color=color, background=background))
+            assert img.tobytes() == expected.tobytes(), (effects, color, background)
+
+
+@pytest.mark.parametrize("name", ["R.Maunick", "Wolfgang Amadeus Mozart"])
+@pytest.mark.parametrize("size", [30, 80, 150])
+@pytest.mark.parametrize("font", list(FONT_PATHS))
+def test_numpy_variants_match_individual_renders(font, size, name):
+    pytest.importorskip("numpy")
+    _assert_matches_individual_renders(font, size, name)
+
+
+@pytest.mark.parametrize("font", list(FONT_PATHS))
+def test_variants_without_numpy_match_individual_renders(font, monkeypatch):
+    monkeypatch.setitem(sys.modules, "numpy", None)  # import numpy raises ImportError
+    _assert_matches_individual_renders(font, 80, "R.Maunick")
@@ -0,0 +1,40 @@
+import xml.dom.minidom
+import pytest
+from renderer import make_spec
+from vector import _Layout, to_pdf, to_svg
+
+pytest.importorskip("fontTools")
+
+VARIABLE = "Font 3 (DancingScript)"
+
+
+def test_axes_change_the_outlines():
+    light = _Layout(make_spec("Wolfgang Mozart", VARIABLE, 80, axes={"wght": 400}))
+    heavy = _Layout(make_spec("Wolfgang Mozart", VARIABLE, 80, axes={"wght": 700}))
+    assert heavy.text_width > light.text_width
+
+
+def test_bold_on_a_variable_font_is_the_heavier_instance():
+    bold = make_spec("Ana Smith", VARIABLE, 80, axes={"wght": 400}, effects=("bold",))
+    heavy = make_spec("Ana Smith", VARIABLE, 80, axes={"wght": 700})
+    assert "bold" not in _Layout(bold).spec.effects
+    assert to_svg(bold) == to_svg(heavy)
+    assert to_pdf(bold) == to_pdf(heavy)
+
+
+def test_svg_colors_are_normalized():
+    svg = to_svg(make_spec("Ana", color="#ff000080", effects=("shadow", "underline")))
+    xml.dom.minidom.parseString(svg)
+    assert 'fill="#ff0000" fill-opacity="0.5"' in svg
+
+
+@pytest.mark.parametrize("export", [to_svg, to_pdf])
+def test_invalid_colors_are_rejected(export):
+    with pytest.raises(ValueError):
+        export(make_spec("Ana", color='red"/><script>alert(1)</script><g x="'))
+
+
+def test_pdf_keeps_translucent_ink():
+    pdf = to_pdf(make_spec("Ana", color="#ff000080"))
+    assert b"/F128 << /ca 0.5 >>" in pdf
+    assert b"/ca" not in to_pdf(make_spec("Ana", color="#ff0000")).replace(b"/ca 1 ", b"")
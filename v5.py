@@ -1,26 +1,81 @@
-import tkinter as tk
-from tkinter import ttk, filedialog, messagebox, colorchooser
-from PIL import Image, ImageDraw, ImageFont, ImageTk
-
-# Font file placeholders (replace with your own .ttf paths)
-FONT_PATHS = {
-    "Font 1 (Great Vibes)": "GreatVibes-Regular.ttf",
-    "Font 2 (Alex-Brush)": "AlexBrush-Regular.ttf",
-    "Font 3 (DancingScript)": "DancingScript-VariableFont_wght.ttf",
-    "Font 4 (Allura)": "Allura-Regular.ttf",
-    "Font 5 (Parisienne)": "Parisienne-Regular.ttf",
-}
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from PIL import ImageFont
+from autofit import fit_size
+from fontregistry import default_registry, font_choices
+from instrument import timed
+from renderer import FONT_PATHS, font_axes, load_font, make_spec, render_signature
+from render_cache import RenderCache, encode_png
+
+# Tk and ImageTk are imported by load_tk() when the GUI starts, so importing
+# this module (and the rendering code) works headless, without a display
+tk = ttk = filedialog = messagebox = colorchooser = ImageTk = None
+
+# Live preview waits this long after the last change before rendering, but
+# never longer than PREVIEW_MAX_WAIT_MS while changes keep coming (slider drags)
+PREVIEW_DEBOUNCE_MS = 60
+PREVIEW_MAX_WAIT_MS = 120
+PREVIEW_POLL_MS = 15
+
+# Font gallery thumbnails, rendered directly at thumbnail resolution; long
+# names are fitted down from GALLERY_FONT_SIZE so the whole name shows
+GALLERY_THUMB_SIZE = (260, 80)
+GALLERY_FONT_SIZE = 34
+GALLERY_MIN_FONT_SIZE = 8
+GALLERY_MARGIN = 4
+GALLERY_COLUMNS = 2
+GALLERY_WORKERS = 4
+
+
+def load_tk():
+    global tk, ttk, filedialog, messagebox, colorchooser, ImageTk
+    import tkinter as tk
+    from tkinter import ttk, filedialog, messagebox, colorchooser
+    from PIL import ImageTk
+
+
+def fit_spec(spec):
+    # `spec` at the largest size that fits its canvas; runs off the main thread
+    try:
+        return spec._replace(size=fit_size(spec.name, spec.font, spec.canvas, spec.effects, axes=spec.axes))
+    except OSError:
+        return spec  # the render reports the font error
+
+
+def to_photo(img):
+    with timed("photoimage"):
+        return ImageTk.PhotoImage(img)
+
 
 class SignatureApp:
     def __init__(self, root):
         self.root = root
         self.root.title("Digital Signature Creator")
         self.root.geometry("1000x600")
+        # Show the window before building the UI; fonts load in the background
+        self.root.update()
+        self.shown_at = time.perf_counter()
+        self.fonts_loaded_at = None
         
         # Default values
         self.preview_img = None
+        self.render_cache = RenderCache()
+        self.live_preview = tk.BooleanVar(value=True)
+        self._preview_worker = ThreadPoolExecutor(max_workers=1)
+        self._preview_future = None
+        self._preview_generation = 0
+        self._preview_after_id = None
+        self._preview_pending_since = None
+        self._poll_after_id = None
+        self._showing_size = False
         self.signature_color = "#000000"  # default = black
+        # Bundled fonts plus any others in the font directories, read from the index
+        self.registry = default_registry()
+        self.fonts = font_choices(self.registry)
         self.font_size = tk.IntVar(value=80)  # default size
+        self.font_weight = tk.IntVar(value=400)
 
         # Main layout: left controls, right preview
         main_frame = ttk.Frame(root, padding=10)
@@ -46,11 +101,19 @@ class SignatureApp:
 
         ttk.Label(font_frame, text="Font:").grid(row=0, column=0, sticky="w", pady=2)
         self.font_choice = tk.StringVar(value="Font 1 (Great Vibes)")
-        font_menu = ttk.Combobox(font_frame, textvariable=self.font_choice, values=list(FONT_PATHS.keys()), state="readonly", width=22)
-        font_menu.grid(row=0, column=1, pady=2)
+        self.start_font_preload()
+        self.font_menu = ttk.Combobox(font_frame, textvariable=self.font_choice, values=list(self.fonts), state="readonly", width=22)
+        self.font_menu.grid(row=0, column=1, pady=2)
 
         ttk.Label(font_frame, text="Font Size:").grid(row=1, column=0, sticky="w", pady=5)
         tk.Scale(font_frame, from_=30, to=150, orient="horizontal", variable=self.font_size, length=200).grid(row=1, column=1, pady=5)
+        self.auto_fit = tk.BooleanVar()
+        ttk.Checkbutton(font_frame, text="Auto-fit size to canvas", variable=self.auto_fit).grid(row=2, column=1, sticky="w")
+
+        # Only fonts with a weight axis (variable fonts) enable the slider
+        ttk.Label(font_frame, text="Weight:").grid(row=3, column=0, sticky="w", pady=5)
+        self.weight_scale = tk.Scale(font_frame, from_=100, to=900, orient="horizontal", variable=self.font_weight, length=200)
+        self.weight_scale.grid(row=3, column=1, pady=5)
 
         # Background settings
         bg_frame = ttk.LabelFrame(controls_frame, text="Background", padding=10)
@@ -81,58 +144,114 @@ class SignatureApp:
         button_frame.pack(fill="x", pady=5)
         ttk.Button(button_frame, text="Preview Signature", command=self.preview_signature).pack(fill="x", pady=2)
         ttk.Button(button_frame, text="Save Signature", command=self.save_signature).pack(fill="x", pady=2)
+        ttk.Checkbutton(button_frame, text="Live preview", variable=self.live_preview,
+                        command=self.schedule_preview).pack(anchor="w", pady=2)
 
         # --- Preview Area ---
         ttk.Label(preview_frame, text="Signature Preview", font=("Arial", 14)).pack(pady=5)
         self.canvas = tk.Label(preview_frame, bg="white", relief="sunken")
         self.canvas.pack(fill="both", expand=True, padx=10, pady=10)
 
+        # --- Font Gallery ---
+        gallery_frame = ttk.LabelFrame(preview_frame, text="Font Gallery (click to select)", padding=5)
+        gallery_frame.pack(fill="x", padx=10, pady=5)
+        self.gallery_canvas = tk.Canvas(gallery_frame, height=190, highlightthickness=0)
+        gallery_scroll = ttk.Scrollbar(gallery_frame, orient="vertical", command=self.gallery_canvas.yview)
+        self.gallery_canvas.configure(yscrollcommand=gallery_scroll.set)
+        gallery_scroll.pack(side="right", fill="y")
+        self.gallery_canvas.pack(side="left", fill="both", expand=True)
+        gallery_inner = ttk.Frame(self.gallery_canvas)
+        self.gallery_canvas.create_window((0, 0), window=gallery_inner, anchor="nw")
+        gallery_inner.bind("<Configure>", lambda e: self.gallery_canvas.configure(scrollregion=self.gallery_canvas.bbox("all")))
+
+        self.gallery_labels = {}
+        self.gallery_images = {}
+        for i, font_name in enumerate(self.fonts):
+            label = tk.Label(gallery_inner, text=font_name, compound="top", bg="white", relief="groove", cursor="hand2")
+            label.grid(row=i // GALLERY_COLUMNS, column=i % GALLERY_COLUMNS, padx=3, pady=3)
+            label.bind("<Button-1>", lambda e, font_name=font_name: self.font_choice.set(font_name))
+            self.gallery_labels[font_name] = label
+        self._gallery_worker = ThreadPoolExecutor(max_workers=GALLERY_WORKERS)
+        self._gallery_cache = RenderCache(memory_bytes=16 << 20)
+        self._gallery_futures = []
+        self._gallery_generation = 0
+        self._gallery_name = None
+        self.font_choice.trace_add("write", self.highlight_gallery)
+        self.highlight_gallery()
+        self.name_var.trace_add("write", self.filter_fonts)
+        self.font_choice.trace_add("write", self.update_weight_range)
+        self.update_weight_range()
+
+        # Re-render the preview whenever any setting changes
+        for var in (self.name_var, self.font_choice, self.font_size, self.font_weight, self.auto_fit, self.bg_choice,
+                    self.bold_effect, self.shadow_effect, self.underline_effect):
+            var.trace_add("write", self.schedule_preview)
+
+    def start_font_preload(self):
+        # Loads the bundled fonts at the sizes the preview and gallery start
+        # with, default font first; Tk variables are read here, not in the thread
+        fonts = sorted(FONT_PATHS, key=lambda font: font != self.font_choice.get())
+        threading.Thread(target=self._preload_fonts, args=(fonts, self.font_size.get(), self.font_weight.get()),
+                         daemon=True).start()
+
+    def _preload_fonts(self, fonts, size, weight):
+        for font in fonts:
+            try:
+                # Variable fonts are previewed at the weight slider's value
+                load_font(font, size, {"wght": weight} if "wght" in font_axes(font) else ())
+                load_font(font, GALLERY_FONT_SIZE)
+            except OSError:
+                pass  # reported when the font is first used
+        self.fonts_loaded_at = time.perf_counter()
+
     def choose_color(self):
         color_code = colorchooser.askcolor(title="Choose Signature Color")
         if color_code[1]:
             self.signature_color = color_code[1]  # hex color
             self.color_label.config(text=f"Current: {self.signature_color}", foreground=self.signature_color)
+            self.schedule_preview()
+
+    def update_weight_range(self, *args):
+        weight = font_axes(self.fonts[self.font_choice.get()]).get("wght")
+        if weight is None:
+            self.weight_scale.config(state="disabled")
+            return
+        low, default, high = weight
+        self.weight_scale.config(state="normal", from_=low, to=high)
+        if not low <= self.font_weight.get() <= high:
+            self.font_weight.set(int(default))
+
+    def signature_spec(self, name, font_path, background="White", fit=True):
+        # With `fit` and auto-fit on, the size is fitted here (for Preview and
+        # Save); the live preview passes fit=False and fits in its worker
+        axes = {"wght": self.font_weight.get()} if "wght" in font_axes(font_path) else {}
+        spec = make_spec(name, font_path, self.font_size.get(), self.signature_color, background,
+                         bold=self.bold_effect.get(), shadow=self.shadow_effect.get(),
+                         underline=self.underline_effect.get(), axes=axes)
+        if fit and self.auto_fit.get():
+            spec = fit_spec(spec)
+            self.show_size(spec.size)
+        return spec
+
+    def show_size(self, size):
+        # Moves the size slider to a fitted size without scheduling a preview
+        if size == self.font_size.get():
+            return
+        self._showing_size = True
+        try:
+            self.font_size.set(size)
+        finally:
+            self._showing_size = False
 
     def generate_signature(self, name, font_path, background="White"):
-        # Create image
-        img = Image.new("RGBA", (900, 300), (255, 255, 255, 0) if background == "Transparent" else "white")
-        draw = ImageDraw.Draw(img)
-        
-        # Load font
+        spec = self.signature_spec(name, font_path, background)
+
+        # Renders are cached, so Save right after Preview reuses the image
         try:
-            font = ImageFont.truetype(font_path, self.font_size.get())
+            return self.render_cache.get_image(spec)
         except OSError:
             messagebox.showerror("Font Error", f"Could not load font: {font_path}")
-            font = ImageFont.load_default()
-        
-        # Center text
-        bbox = draw.textbbox((0, 0), name, font=font)
-        text_width = bbox[2] - bbox[0]
-        text_height = bbox[3] - bbox[1]
-        position = ((900 - text_width) // 2, (300 - text_height) // 2)
-        
-        # Shadow effect
-        if self.shadow_effect.get():
-            shadow_offset = 3
-            draw.text((position[0]+shadow_offset, position[1]+shadow_offset),
-                      name, fill="gray", font=font)
-        
-        # Bold effect (draw multiple times)
-        if self.bold_effect.get():
-            offsets = [(0,0), (1,0), (0,1), (1,1)]
-            for dx, dy in offsets:
-                draw.text((position[0]+dx, position[1]+dy),
-                          name, fill=self.signature_color, font=font)
-        else:
-            draw.text(position, name, fill=self.signature_color, font=font)
-        
-        # Underline effect
-        if self.underline_effect.get():
-            underline_y = position[1] + text_height + 5
-            draw.line((position[0], underline_y, position[0]+text_width, underline_y),
-                      fill=self.signature_color, width=3)
-        
-        return img
+            return render_signature(spec, ImageFont.load_default())
 
     def preview_signature(self):
         name = self.name_var.get().strip()
@@ -140,33 +259,214 @@ class SignatureApp:
             messagebox.showwarning("Input Required", "Please enter a name.")
             return
         
-        font_path = FONT_PATHS[self.font_choice.get()]
+        font_path = self.fonts[self.font_choice.get()]
         background = self.bg_choice.get()
         
         img = self.generate_signature(name, font_path, background)
         
-        self.preview_img = ImageTk.PhotoImage(img)
+        self.refresh_gallery(name)
+
+        # Anything still rendering in the background is now stale
+        self._preview_generation += 1
+        self.preview_img = to_photo(img)
         self.canvas.config(image=self.preview_img)
 
+    # --- Live preview ---
+
+    def schedule_preview(self, *args):
+        # Debounce: restart the timer on every change while dragging or typing
+        if self._showing_size:
+            return
+        if self._preview_after_id is not None:
+            self.root.after_cancel(self._preview_after_id)
+            self._preview_after_id = None
+        if not self.live_preview.get():
+            self._preview_pending_since = None
+            return
+        now = time.monotonic()
+        if self._preview_pending_since is None:
+            self._preview_pending_since = now
+        waited_ms = (now - self._preview_pending_since) * 1000
+        delay = max(0, min(PREVIEW_DEBOUNCE_MS, PREVIEW_MAX_WAIT_MS - waited_ms))
+        self._preview_after_id = self.root.after(int(delay), self._start_live_preview)
+
+    def _start_live_preview(self):
+        self._preview_after_id = None
+        self._preview_pending_since = None
+        self._preview_generation += 1
+        name = self.name_var.get().strip()
+        self.refresh_gallery(name)
+        if not name:
+            self.preview_img = None
+            self.canvas.config(image="")
+            return
+
+        # Tk variables are read here, on the main thread; the worker fits and renders
+        spec = self.signature_spec(name, self.fonts[self.font_choice.get()], self.bg_choice.get(), fit=False)
+        if self._preview_future is not None:
+            self._preview_future.cancel()  # only succeeds if it hasn't started yet
+        self._preview_future = self._preview_worker.submit(self._render_preview, spec, self._preview_generation,
+                                                           self.auto_fit.get())
+        if self._poll_after_id is None:
+            self._poll_after_id = self.root.after(PREVIEW_POLL_MS, self._poll_live_preview)
+
+    def _render_preview(self, spec, generation, fit):
+        if generation != self._preview_generation:
+            return generation, None, None  # superseded before it started
+        if fit:
+            spec = fit_spec(spec)
+        try:
+            img = self.render_cache.get_image(spec)
+        except OSError:
+            img = render_signature(spec, ImageFont.load_default())
+        return generation, img, spec.size
+
+    def _poll_live_preview(self):
+        self._poll_after_id = None
+        future = self._preview_future
+        if future is None or future.cancelled():
+            return
+        if not future.done():
+            self._poll_after_id = self.root.after(PREVIEW_POLL_MS, self._poll_live_preview)
+            return
+        self._preview_future = None
+        generation, img, size = future.result()
+        # Drop results that a newer change or an explicit Preview has replaced
+        if img is not None and generation == self._preview_generation:
+            self.preview_img = to_photo(img)
+            self.canvas.config(image=self.preview_img)
+            if self.auto_fit.get():
+                self.show_size(size)
+
+    # --- Font gallery ---
+
+    def refresh_gallery(self, name):
+        # Thumbnails depend only on (name, font), so other settings don't re-render them
+        if name == self._gallery_name:
+            return
+        self._gallery_name = name
+        self._gallery_generation += 1
+        for future in self._gallery_futures:
+            future.cancel()
+        self._gallery_futures = []
+        if not name:
+            self.gallery_images = {}
+            for label in self.gallery_labels.values():
+                label.config(image="")
+            return
+
+        for font_name in self.usable_fonts(name):
+            spec = make_spec(name, self.fonts[font_name], GALLERY_FONT_SIZE, canvas=GALLERY_THUMB_SIZE)
+            self._gallery_futures.append(self._gallery_worker.submit(self._render_thumbnail, font_name, spec))
+        self.root.after(PREVIEW_POLL_MS, self._poll_gallery, self._gallery_generation)
+
+    def _render_thumbnail(self, font_name, spec):
+        try:
+            spec = spec._replace(size=fit_size(spec.name, spec.font, spec.canvas, margin=GALLERY_MARGIN,
+                                               min_size=GALLERY_MIN_FONT_SIZE, max_size=GALLERY_FONT_SIZE))
+            return font_name, self._gallery_cache.get_image(spec)
+        except OSError:
+            return font_name, None
+
+    def _poll_gallery(self, generation):
+        if generation != self._gallery_generation:
+            return
+        # Fill in thumbnails as each one finishes
+        pending = []
+        for future in self._gallery_futures:
+            if not future.done():
+                pending.append(future)
+                continue
+            font_name, img = future.result()
+            if img is not None:
+                self.gallery_images[font_name] = to_photo(img)
+                self.gallery_labels[font_name].config(image=self.gallery_images[font_name])
+        self._gallery_futures = pending
+        if pending:
+            self.root.after(PREVIEW_POLL_MS, self._poll_gallery, generation)
+
+    # --- Font coverage ---
+
+    def usable_fonts(self, name):
+        # Fonts with a glyph for every character of the name, by index lookup
+        return [font_name for font_name, path in self.fonts.items() if self.registry.covers(path, name)]
+
+    def filter_fonts(self, *args):
+        # Only offer fonts that can render the name; switch to a fallback if
+        # the selected one can't
+        usable = self.usable_fonts(self.name_var.get().strip()) or list(self.fonts)
+        self.font_menu.config(values=usable)
+        for font_name, label in self.gallery_labels.items():
+            if font_name in usable:
+                label.grid()
+            else:
+                label.grid_remove()
+        if self.font_choice.get() not in usable:
+            self.font_choice.set(usable[0])
+
+    def highlight_gallery(self, *args):
+        for font_name, label in self.gallery_labels.items():
+            selected = font_name == self.font_choice.get()
+            label.config(relief="solid" if selected else "groove", bd=2 if selected else 1)
+
     def save_signature(self):
         name = self.name_var.get().strip()
         if not name:
             messagebox.showwarning("Input Required", "Please enter a name.")
             return
         
-        font_path = FONT_PATHS[self.font_choice.get()]
+        font_path = self.fonts[self.font_choice.get()]
         background = self.bg_choice.get()
         
-        img = self.generate_signature(name, font_path, background)
+        spec = self.signature_spec(name, font_path, background)
+        try:
+            png = self.render_cache.get_png(spec)
+        except OSError:
+            messagebox.showerror("Font Error", f"Could not load font: {font_path}")
+            png = encode_png(render_signature(spec, ImageFont.load_default()))
         
         filetypes = [("PNG Image", "*.png")]
         filepath = filedialog.asksaveasfilename(defaultextension=".png", filetypes=filetypes)
         if filepath:
-            img.save(filepath)
+            with open(filepath, "wb") as f:
+                f.write(png)
             messagebox.showinfo("Saved", f"Signature saved as {filepath}")
 
-# Run the app
-if __name__ == "__main__":
+def startup_timings(name="R.Maunick", start=None):
+    # Starts the GUI, types `name` and closes it once the live preview shows.
+    # Returns ms since `start` (default: now) until Tk was imported, the
+    # window was first shown, the fonts were preloaded and the preview appeared.
+    start = time.perf_counter() if start is None else start
+    load_tk()
+    tk_loaded = time.perf_counter()
     root = tk.Tk()
     app = SignatureApp(root)
+    timings = {}
+
+    def poll():
+        if app.preview_img is None:
+            root.after(5, poll)
+            return
+        timings["first_preview_ms"] = (time.perf_counter() - start) * 1000
+        root.destroy()
+
+    root.after(0, app.name_var.set, name)
+    root.after(5, poll)
     root.mainloop()
+    timings["tk_import_ms"] = (tk_loaded - start) * 1000
+    timings["first_frame_ms"] = (app.shown_at - start) * 1000
+    if app.fonts_loaded_at is not None:
+        timings["fonts_preloaded_ms"] = (app.fonts_loaded_at - start) * 1000
+    return timings
+
+
+def main():
+    load_tk()
+    root = tk.Tk()
+    app = SignatureApp(root)
+    root.mainloop()
+
+
+# Run the app
+if __name__ == "__main__":
+    sys.exit(main())
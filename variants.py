@@ -0,0 +1,103 @@
+import argparse
+import os
+import sys
+from PIL import Image, ImageColor
+from effects import composite
+from renderer import DEFAULT_FONT, FONT_PATHS, background_color, make_spec, render_font, signature_layers
+
+# Color/background variants of one signature from a single rasterization.
+# The effect layers are built once with a placeholder ink; each variant only
+# swaps in its ink color. With NumPy installed, all variants are composited
+# in one vectorized pass using the same integer blend as ImageDraw.bitmap, so
+# the results are identical to rendering each variant separately (see
+# tests/test_variants.py). Without NumPy the shared layers are composited per variant.
+#
+#   images = render_variants(spec, [("#000000", "White"), ("#1a237e", "Transparent")])
+
+# Stands in for the ink color while the layers are built; never parsed as a color
+_INK = "\0ink"
+
+
+def _rgba(color):
+    rgba = ImageColor.getrgb(color)
+    return rgba if len(rgba) == 4 else rgba + (255,)
+
+
+def render_variants(spec, variants, font=None, atlas=False):
+    # Returns one RGBA image per (color, background) in `variants`
+    variants = [(color, background) for color, background in variants]
+    if font is None:
+        font, effects = render_font(spec)
+        spec = spec._replace(effects=effects)
+    layers = signature_layers(spec._replace(color=_INK), font, atlas)
+    try:
+        import numpy
+    except ImportError:
+        return [_composite_variant(spec, layers, color, background) for color, background in variants]
+    return _composite_numpy(numpy, spec, layers, variants)
+
+
+def _composite_variant(spec, layers, color, background):
+    img = Image.new("RGBA", spec.canvas, background_color(background))
+    return composite(img, [layer._replace(fill=color if layer.fill == _INK else layer.fill) for layer in layers])
+
+
+def _composite_numpy(np, spec, layers, variants):
+    width, height = spec.canvas
+    count = len(variants)
+    out = np.empty((count, height, width, 4), np.uint8)
+    out[...] = np.array([background_color(background) for _, background in variants], np.uint8)[:, None, None, :]
+    inks = np.array([_rgba(color) for color, _ in variants], np.uint16)
+
+    pixels = out.reshape(count, height * width, 4)
+    for layer in layers:
+        # Clip the layer to the canvas, as draw.bitmap does
+        x, y = layer.offset
+        left, top = max(x, 0), max(y, 0)
+        right, bottom = min(x + layer.mask.size[0], width), min(y + layer.mask.size[1], height)
+        if left >= right or top >= bottom:
+            continue
+        mask = np.asarray(layer.mask.crop((left - x, top - y, right - x, bottom - y)))
+        # Only covered pixels change, so blend just those
+        ys, xs = np.nonzero(mask)
+        if not len(ys):
+            continue
+        index = (ys + top) * width + (xs + left)
+        coverage = mask[ys, xs].astype(np.uint16)[None, :, None]
+        if layer.fill == _INK:
+            fill = inks[:, None, :]
+        else:
+            fill = np.array(_rgba(layer.fill), np.uint16)[None, None, :]
+        dst = pixels[:, index, :].astype(np.uint16)
+        # Color channels of fully transparent pixels take the ink outright
+        coverage = np.repeat(np.broadcast_to(coverage, dst.shape[:2] + (1,)), 4, axis=2)
+        coverage[..., :3][dst[..., 3] == 0] = 255
+        blended = fill * coverage + dst * (255 - coverage) + 128
+        pixels[:, index, :] = (blended + (blended >> 8)) >> 8
+
+    return [Image.fromarray(out[i], "RGBA") for i in range(count)]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render one signature in several colors and backgrounds.")
+    parser.add_argument("name")
+    parser.add_argument("--font", default=DEFAULT_FONT, choices=list(FONT_PATHS))
+    parser.add_argument("--size", type=int, default=80)
+    parser.add_argument("--colors", nargs="+", default=["#000000"])
+    parser.add_argument("--backgrounds", nargs="+", default=["White", "Transparent"], choices=["White", "Transparent"])
+    parser.add_argument("--effects", nargs="*", default=[])
+    parser.add_argument("--output-dir", default=".")
+    args = parser.parse_args(argv)
+
+    spec = make_spec(args.name, args.font, args.size, effects=args.effects)
+    variants = [(color, background) for color in args.colors for background in args.backgrounds]
+    os.makedirs(args.output_dir, exist_ok=True)
+    for (color, background), img in zip(variants, render_variants(spec, variants)):
+        path = os.path.join(args.output_dir, f"signature_{color.lstrip('#')}_{background.lower()}.png")
+        img.save(path)
+        print(f"Signature saved as {path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
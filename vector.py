@@ -0,0 +1,300 @@
+import argparse
+import zlib
+from functools import lru_cache
+from fontTools.pens.basePen import BasePen
+from fontTools.pens.boundsPen import BoundsPen
+from fontTools.pens.svgPathPen import SVGPathPen
+from fontTools.ttLib import TTFont
+from PIL import ImageColor
+from renderer import font_axes, render_instance, resolve_font_path
+
+# Vector (SVG/PDF) export straight from the TTF glyph outlines, so signatures
+# print sharp at any DPI without a raster render. Outlines are cached per
+# (font, glyph) and placed with the same advances and centering as
+# render_signature. Shadow, underline, bold and outline become vector
+# elements; glow is SVG-only (a blur filter), other effects are ignored.
+# Variable fonts are drawn at the spec's axes, with the same heavier instance
+# for bold as the raster (renderer.render_instance).
+#
+# Needs fontTools (pip install fonttools); nothing else imports this module
+# unless vector output is requested.
+
+SHADOW_OFFSET = 3
+SHADOW_COLOR = "gray"
+GLOW_COLOR = "#fff59d"
+UNDERLINE_GAP = 5
+UNDERLINE_WIDTH = 3
+
+
+class VectorFont:
+    def __init__(self, path, location=()):
+        # `location`: (tag, value) pairs of a variable font instance
+        self.tt = TTFont(path, lazy=True)
+        self.glyphs = self.tt.getGlyphSet(location=dict(location) or None)
+        self.cmap = self.tt.getBestCmap()
+        self.units_per_em = self.tt["head"].unitsPerEm
+        self.ascent = self.tt["hhea"].ascent
+        self._svg = {}
+        self._pdf = {}
+        self._bounds = {}
+
+    def glyph_name(self, char):
+        return self.cmap.get(ord(char), ".notdef")
+
+    def advance(self, glyph):
+        # Varied by HVAR/gvar at the instance's location
+        return self.glyphs[glyph].width
+
+    def bounds(self, glyph):
+        # (xMin, yMin, xMax, yMax) in font units, or None for blank glyphs
+        if glyph not in self._bounds:
+            pen = BoundsPen(self.glyphs)
+            self.glyphs[glyph].draw(pen)
+            self._bounds[glyph] = pen.bounds
+        return self._bounds[glyph]
+
+    def svg_path(self, glyph):
+        # Path data in font units (y up)
+        if glyph not in self._svg:
+            pen = SVGPathPen(self.glyphs, ntos=lambda v: ("%.1f" % v).rstrip("0").rstrip("."))
+            self.glyphs[glyph].draw(pen)
+            self._svg[glyph] = pen.getCommands()
+        return self._svg[glyph]
+
+    def pdf_segments(self, glyph):
+        # [(operator, points)] in font units, quadratics converted to cubics
+        if glyph not in self._pdf:
+            pen = PDFPen(self.glyphs)
+            self.glyphs[glyph].draw(pen)
+            self._pdf[glyph] = pen.segments
+        return self._pdf[glyph]
+
+
+class PDFPen(BasePen):
+    # Records PDF path operators; BasePen turns TrueType quadratics into cubics
+    def __init__(self, glyphs):
+        super().__init__(glyphs)
+        self.segments = []
+
+    def _moveTo(self, pt):
+        self.segments.append(("m", (pt,)))
+
+    def _lineTo(self, pt):
+        self.segments.append(("l", (pt,)))
+
+    def _curveToOne(self, pt1, pt2, pt3):
+        self.segments.append(("c", (pt1, pt2, pt3)))
+
+    def _closePath(self):
+        self.segments.append(("h", ()))
+
+
+@lru_cache(maxsize=32)
+def vector_font(path, location=()):
+    return VectorFont(path, location)
+
+
+def _location(font, axes):
+    # Axis values clamped to the font's ranges, as load_font does
+    ranges = font_axes(font)
+    return tuple((tag, min(ranges[tag][2], max(ranges[tag][0], value))) for tag, value in axes if tag in ranges)
+
+
+class _Layout:
+    # Glyph placements in canvas pixels (y down), centered like render_signature.
+    # self.spec has the effects left after render_instance (bold may be a weight).
+    def __init__(self, spec):
+        axes, effects = render_instance(spec)
+        self.spec = spec = spec._replace(effects=effects)
+        self.font = vector_font(resolve_font_path(spec.font), _location(spec.font, axes))
+        self.scale = spec.size / self.font.units_per_em
+        baseline = self.font.ascent * self.scale
+        self.glyphs = []
+        pen = 0
+        boxes = []
+        for char in spec.name:
+            glyph = self.font.glyph_name(char)
+            self.glyphs.append((glyph, pen))
+            bounds = self.font.bounds(glyph)
+            if bounds:
+                boxes.append((pen + bounds[0] * self.scale, baseline - bounds[3] * self.scale,
+                              pen + bounds[2] * self.scale, baseline - bounds[1] * self.scale))
+            pen += self.font.advance(glyph) * self.scale
+        if not boxes:
+            boxes = [(0, 0, 0, 0)]
+        left, top = min(b[0] for b in boxes), min(b[1] for b in boxes)
+        right, bottom = max(b[2] for b in boxes), max(b[3] for b in boxes)
+        width, height = spec.canvas
+        self.text_width, self.text_height = right - left, bottom - top
+        self.position = ((width - self.text_width) // 2, (height - self.text_height) // 2)
+        # Like the raster, the ink box's top-left lands at position + (left, top)
+        self.origin_x = self.position[0]
+        self.baseline = self.position[1] + baseline
+
+    def placements(self, dx=0, dy=0):
+        # (glyph, x, y) with the baseline origin of every glyph
+        for glyph, pen in self.glyphs:
+            yield glyph, self.origin_x + pen + dx, self.baseline + dy
+
+    def underline_box(self):
+        y = self.position[1] + self.text_height + UNDERLINE_GAP - UNDERLINE_WIDTH // 2
+        return self.position[0], y, self.text_width + 1, UNDERLINE_WIDTH
+
+
+def _num(value):
+    return ("%.2f" % value).rstrip("0").rstrip(".")
+
+
+def _svg_paint(color, attr="fill"):
+    # `fill="#rrggbb"` (or stroke) plus its opacity for translucent colors;
+    # parsing rejects anything that is not a color, so nothing else reaches the markup
+    rgba = ImageColor.getrgb(color)
+    paint = f'{attr}="#{rgba[0]:02x}{rgba[1]:02x}{rgba[2]:02x}"'
+    if len(rgba) == 4 and rgba[3] < 255:
+        paint += f' {attr}-opacity="{_num(rgba[3] / 255)}"'
+    return paint
+
+
+def to_svg(spec):
+    layout = _Layout(spec)
+    spec = layout.spec
+    width, height = spec.canvas
+    s = layout.scale
+    used = sorted({glyph for glyph, _ in layout.glyphs if layout.font.bounds(glyph)})
+    ids = {glyph: f"g{i}" for i, glyph in enumerate(used)}
+
+    def uses(dx=0, dy=0):
+        return "".join(
+            f'<use href="#{ids[glyph]}" transform="matrix({_num(s)} 0 0 {_num(-s)} {_num(x)} {_num(y)})"/>'
+            for glyph, x, y in layout.placements(dx, dy) if glyph in ids)
+
+    parts = [f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" viewBox="0 0 {width} {height}">']
+    defs = [f'<path id="{ids[glyph]}" d="{layout.font.svg_path(glyph)}"/>' for glyph in used]
+    if "glow" in spec.effects:
+        defs.append('<filter id="glow" x="-20%" y="-50%" width="140%" height="200%"><feMorphology operator="dilate" radius="1"/><feGaussianBlur stdDeviation="6"/></filter>')
+    parts.append("<defs>" + "".join(defs) + "</defs>")
+    if spec.background != "Transparent":
+        parts.append(f'<rect width="{width}" height="{height}" fill="white"/>')
+    if "glow" in spec.effects:
+        parts.append(f'<g {_svg_paint(GLOW_COLOR)} filter="url(#glow)">{uses()}</g>')
+    if "shadow" in spec.effects:
+        parts.append(f'<g {_svg_paint(SHADOW_COLOR)}>{uses(SHADOW_OFFSET, SHADOW_OFFSET)}</g>')
+
+    text_fill = "white" if "outline" in spec.effects else spec.color
+    if "bold" in spec.effects:
+        # Half a pixel each way around a half-pixel shift: the raster's 2x2 dilation
+        parts.append(f'<g {_svg_paint(text_fill)} {_svg_paint(spec.color, "stroke")} stroke-width="{_num(1 / s)}" '
+                     f'stroke-linejoin="round">{uses(0.5, 0.5)}</g>')
+    else:
+        parts.append(f'<g {_svg_paint(text_fill)}>{uses()}</g>')
+    if "outline" in spec.effects:
+        parts.append(f'<g fill="none" {_svg_paint(spec.color, "stroke")} stroke-width="{_num(4 / s)}" '
+                     f'stroke-linejoin="round">{uses()}</g>')
+        parts.append(f'<g fill="white">{uses()}</g>')
+    if "underline" in spec.effects:
+        x, y, w, h = layout.underline_box()
+        parts.append(f'<rect x="{_num(x)}" y="{_num(y)}" width="{_num(w)}" height="{h}" {_svg_paint(spec.color)}/>')
+    parts.append("</svg>")
+    return "".join(parts)
+
+
+def _pdf_color(color, op, states):
+    # Color operator ("rg" fill, "RG" stroke) preceded by the graphics state
+    # with the color's opacity; `states` collects the ExtGState resources
+    rgba = ImageColor.getrgb(color)
+    r, g, b = rgba[:3]
+    alpha = rgba[3] if len(rgba) == 4 else 255
+    name = ("F" if op == "rg" else "S") + str(alpha)
+    states[name] = f"<< /{'ca' if op == 'rg' else 'CA'} {_num(alpha / 255)} >>"
+    return f"/{name} gs {_num(r / 255)} {_num(g / 255)} {_num(b / 255)} {op}"
+
+
+def _pdf_glyphs(layout, page_height, dx=0, dy=0):
+    # Path operators for every glyph, transformed to PDF space (y up)
+    ops = []
+    s = layout.scale
+    for glyph, x, y in layout.placements(dx, dy):
+        for op, points in layout.font.pdf_segments(glyph):
+            coords = " ".join(f"{_num(x + px * s)} {_num(page_height - y + py * s)}" for px, py in points)
+            ops.append(f"{coords} {op}" if coords else op)
+    return "\n".join(ops)
+
+
+def to_pdf(spec):
+    layout = _Layout(spec)
+    spec = layout.spec
+    width, height = spec.canvas
+    content = []
+    states = {}
+    if spec.background != "Transparent":
+        content.append(f"1 1 1 rg 0 0 {width} {height} re f")
+    if "shadow" in spec.effects:
+        content.append(_pdf_color(SHADOW_COLOR, "rg", states))
+        content.append(_pdf_glyphs(layout, height, SHADOW_OFFSET, SHADOW_OFFSET) + "\nf")
+    text_fill = "white" if "outline" in spec.effects else spec.color
+    if "outline" in spec.effects:
+        content.append(_pdf_color(spec.color, "RG", states) + " 4 w 1 j")
+        content.append(_pdf_glyphs(layout, height) + "\nS")
+    content.append(_pdf_color(text_fill, "rg", states))
+    if "bold" in spec.effects:
+        content.append(_pdf_color(spec.color, "RG", states) + " 1 w 1 j")
+        content.append(_pdf_glyphs(layout, height, 0.5, 0.5) + "\nB")
+    else:
+        content.append(_pdf_glyphs(layout, height) + "\nf")
+    if "underline" in spec.effects:
+        x, y, w, h = layout.underline_box()
+        content.append(_pdf_color(spec.color, "rg", states) + f" {_num(x)} {_num(height - y - h)} {_num(w)} {h} re f")
+    stream = zlib.compress("\n".join(content).encode("ascii"), 9)
+    resources = "<< /ExtGState << %s >> >>" % " ".join(f"/{name} {state}" for name, state in sorted(states.items()))
+
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {width} {height}] /Resources {resources} "
+        "/Contents 4 0 R >>".encode("ascii"),
+        b"<< /Length %d /Filter /FlateDecode >>\nstream\n" % len(stream) + stream + b"\nendstream",
+    ]
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(out)
+
+
+def vector_data(spec, path):
+    # PDF or SVG bytes, chosen by the extension of `path`
+    return to_pdf(spec) if path.lower().endswith(".pdf") else to_svg(spec).encode("utf-8")
+
+
+def export_vector(spec, path):
+    data = vector_data(spec, path)
+    with open(path, "wb") as f:
+        f.write(data)
+    return len(data)
+
+
+def main(argv=None):
+    from renderer import DEFAULT_FONT, FONT_PATHS, make_spec
+
+    parser = argparse.ArgumentParser(description="Export a signature as SVG or PDF from the font outlines.")
+    parser.add_argument("name")
+    parser.add_argument("output", help="output .svg or .pdf file")
+    parser.add_argument("--font", default=DEFAULT_FONT, choices=list(FONT_PATHS))
+    parser.add_argument("--size", type=int, default=80)
+    parser.add_argument("--color", default="#000000")
+    parser.add_argument("--background", default="White", choices=["White", "Transparent"])
+    parser.add_argument("--effects", nargs="*", default=[])
+    args = parser.parse_args(argv)
+
+    spec = make_spec(args.name, args.font, args.size, args.color, args.background, effects=args.effects)
+    size = export_vector(spec, args.output)
+    print(f"Signature saved as {args.output} ({size} bytes)")
+
+
+if __name__ == "__main__":
+    main()
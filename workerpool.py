@@ -0,0 +1,406 @@
+import argparse
+import gc
+import multiprocessing
+import multiprocessing.pool
+import os
+import queue
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import Executor, Future, InvalidStateError
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing.connection import wait as wait_sentinels
+from export import encode_compact
+from instrument import suspended
+from render_cache import encode_png
+from renderer import FONT_PATHS, make_spec, preload_fonts, render_signature
+
+# Warm worker pool: the parent process imports PIL, loads every font at the
+# preload sizes and runs one full render + encode per font, then forks the
+# workers. They start with all of that already in memory, shared with the
+# parent copy-on-write, instead of each parsing the fonts again. gc.freeze()
+# before forking keeps the collector from touching (and so copying) the
+# inherited objects.
+#
+# Workers are recycled after `max_tasks_per_child` tasks to cap memory creep;
+# replacements are forked from the same warm parent, so recycling is cheap.
+# worker_stats() reports each worker's task count, time to its first result
+# and (on Linux) RSS, PSS and how much of it is still shared. A task that
+# produces several results (a batch chunk) calls mark_result() after each, so
+# that time covers one render rather than the whole first task.
+#
+# multiprocessing.Pool silently replaces a worker that dies mid-task (OOM
+# kill, segfault) and never completes its task. A monitor thread watches the
+# workers instead; when one exits abnormally every outstanding future fails
+# with BrokenProcessPool and the pool refuses new work, as ProcessPoolExecutor
+# does.
+#
+#   with WarmPool(4, max_tasks_per_child=500, warm=warm_render_path) as pool:
+#       pool.submit(render, spec).result()
+#
+# WarmPool is a concurrent.futures.Executor, so it drops in for the
+# ProcessPoolExecutor in batch.py and server.py (--warm-pool). Where fork is
+# unavailable (Windows, macOS defaults) it falls back to spawn and the
+# `warm` function runs in every worker instead.
+#
+#   python workerpool.py --workers 4 --jobs 400    # compare spawn / fork / warm fork
+
+# Stats of recycled workers are kept for the most recent ones only
+MAX_WORKER_STATS = 256
+# How often the monitor picks up workers the pool has started since
+MONITOR_INTERVAL = 0.1
+
+_worker = None  # per-process state in a worker
+
+
+def warm_render_path(sizes=(80,), fonts=None):
+    # Loads the fonts and runs one render + PNG encode per font so the modules,
+    # font instances and lazily built tables a render needs exist before forking.
+    # Its spans are not recorded, so a --trace covers only the real work.
+    from effects import available_effects
+
+    with suspended():
+        preload_fonts(sizes, fonts)
+        for font in fonts or FONT_PATHS:
+            for effects in ((), tuple(available_effects())):
+                img = render_signature(make_spec("Warm-up", font, sizes[0], effects=effects))
+                encode_png(img)
+                encode_compact(img)
+
+
+def _init_worker(warm, initializer, initargs):
+    global _worker
+    start = time.perf_counter()
+    if warm is not None:
+        warm()
+    if initializer is not None:
+        initializer(*initargs)
+    _worker = {"ready_ms": (time.perf_counter() - start) * 1000, "tasks": 0, "first_result": None}
+
+
+def _call(fn, args, kwargs):
+    # Runs one task in a worker; the timings ride back with the result
+    start = time.perf_counter()
+    _worker["first_result"] = None
+    result = fn(*args, **kwargs)
+    end = time.perf_counter()
+    _worker["tasks"] += 1
+    first = _worker["first_result"] or end
+    return result, os.getpid(), (end - start) * 1000, (first - start) * 1000, _worker["ready_ms"]
+
+
+def mark_result():
+    # Called by a task when one of its results is done; a no-op outside a
+    # WarmPool worker and after the task's first result
+    if _worker is not None and _worker["first_result"] is None:
+        _worker["first_result"] = time.perf_counter()
+
+
+def process_memory(pid):
+    # {"rss", "pss", "shared", "private"} in bytes from /proc/<pid>/smaps_rollup,
+    # or None where that is unavailable (non-Linux, process gone)
+    fields = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                if value.strip().endswith("kB"):
+                    fields[key] = int(value.split()[0]) * 1024
+    except (OSError, ValueError):
+        return None
+    return {
+        "rss": fields.get("Rss", 0),
+        "pss": fields.get("Pss", 0),
+        "shared": fields.get("Shared_Clean", 0) + fields.get("Shared_Dirty", 0),
+        "private": fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0),
+    }
+
+
+def tree_memory(pid=None):
+    # Summed {"rss", "pss"} of a process and all its descendants (a pool's
+    # workers and their helpers), or None without /proc. PSS counts pages
+    # shared between them once, so it is the figure to hold against a limit.
+    pid = pid or os.getpid()
+    parents = {}
+    try:
+        entries = os.listdir("/proc")
+    except OSError:
+        return None
+    for entry in entries:
+        if entry.isdigit():
+            try:
+                with open(f"/proc/{entry}/stat") as f:
+                    # The command name may contain spaces; ppid follows it
+                    parents[int(entry)] = int(f.read().rpartition(")")[2].split()[1])
+            except (OSError, ValueError, IndexError):
+                pass
+    tree, frontier = [], [pid]
+    while frontier:
+        current = frontier.pop()
+        tree.append(current)
+        frontier.extend(child for child, parent in parents.items() if parent == current)
+    total = {"rss": 0, "pss": 0}
+    for member in tree:
+        memory = process_memory(member)
+        if memory is None and member == pid:
+            return None
+        for key in total:
+            total[key] += memory[key] if memory else 0
+    return total
+
+
+class _TrackedPool(multiprocessing.pool.Pool):
+    # A Pool that reports every worker it starts, replacements included, so
+    # a worker that dies before anyone looked at the pool is still noticed
+    def __init__(self, started, *args, **kwargs):
+        self._started = started
+        super().__init__(*args, **kwargs)
+
+    def Process(self, ctx, *args, **kwargs):
+        process = ctx.Process(*args, **kwargs)
+        self._started.put(process)
+        return process
+
+
+class WarmPool(Executor):
+    def __init__(self, workers=None, max_tasks_per_child=None, warm=None, initializer=None, initargs=(),
+                 start_method=None):
+        # `warm` runs once in this process before forking (in every worker
+        # under spawn); `initializer` runs in every worker, e.g. for
+        # per-process caches that must not be shared
+        self.workers = workers or os.cpu_count() or 1
+        self.max_tasks_per_child = max_tasks_per_child
+        if start_method is None:
+            start_method = "fork" if "fork" in multiprocessing.get_all_start_methods() else "spawn"
+        self.start_method = start_method
+        self.warm_ms = 0.0
+        if start_method == "fork" and warm is not None:
+            start = time.perf_counter()
+            warm()
+            self.warm_ms = (time.perf_counter() - start) * 1000
+            warm = None
+        self._stats = {}
+        self._lock = threading.Lock()
+        self._pending = set()
+        self._broken = None
+        self._closing = False
+        self._started = queue.SimpleQueue()
+        if start_method == "fork":
+            gc.freeze()
+        try:
+            self._pool = _TrackedPool(self._started, self.workers, _init_worker, (warm, initializer, tuple(initargs)),
+                                      max_tasks_per_child, multiprocessing.get_context(start_method))
+        finally:
+            # The first workers are forked by now; the parent's own collector
+            # must not stay frozen (replacement workers fork without it)
+            if start_method == "fork":
+                gc.unfreeze()
+        self._monitor = threading.Thread(target=self._watch_workers, name="WarmPool monitor", daemon=True)
+        self._monitor.start()
+
+    def submit(self, fn, /, *args, **kwargs):
+        future = Future()
+        future.set_running_or_notify_cancel()
+        with self._lock:
+            if self._broken is not None:
+                raise BrokenProcessPool(self._broken)
+            self._pending.add(future)
+
+        def settle(set_outcome, outcome):
+            with self._lock:
+                self._pending.discard(future)
+            try:
+                set_outcome(outcome)
+            except InvalidStateError:
+                pass  # cancelled by the caller meanwhile, or failed by the monitor
+
+        def done(value):
+            result, pid, task_ms, first_ms, ready_ms = value
+            self._record(pid, task_ms, first_ms, ready_ms)
+            settle(future.set_result, result)
+
+        def failed(error):
+            settle(future.set_exception, error)
+
+        try:
+            self._pool.apply_async(_call, (fn, args, kwargs), callback=done, error_callback=failed)
+        except ValueError:  # the pool was terminated since the check above
+            with self._lock:
+                self._pending.discard(future)
+            raise BrokenProcessPool(self._broken or "the pool has been shut down") from None
+        return future
+
+    def _watch_workers(self):
+        # Fails every outstanding future once a worker exits with an error.
+        # Recycled workers exit with 0.
+        workers = []
+        while not self._closing:
+            while True:
+                try:
+                    workers.append(self._started.get_nowait())
+                except queue.Empty:
+                    break
+            # A worker is queued just before it starts (pid None until then)
+            wait_sentinels([process.sentinel for process in workers if process.pid is not None], MONITOR_INTERVAL)
+            for process in list(workers):
+                if process.exitcode is None:
+                    continue
+                workers.remove(process)
+                if process.exitcode != 0 and not self._closing:
+                    self._break(f"a worker process (pid {process.pid}) exited unexpectedly "
+                                f"with code {process.exitcode}")
+                    return
+
+    def _break(self, reason):
+        with self._lock:
+            self._broken = reason
+        self._fail_pending(reason)
+        self._closing = True
+        self._pool.terminate()
+
+    def _fail_pending(self, reason):
+        with self._lock:
+            pending, self._pending = self._pending, set()
+        for future in pending:
+            try:
+                future.set_exception(BrokenProcessPool(reason))
+            except InvalidStateError:
+                pass
+
+    def _record(self, pid, task_ms, first_ms, ready_ms):
+        with self._lock:
+            entry = self._stats.get(pid)
+            if entry is None:
+                entry = self._stats[pid] = {"pid": pid, "tasks": 0, "ready_ms": ready_ms,
+                                            "first_result_ms": first_ms, "total_task_ms": 0.0}
+                if len(self._stats) > MAX_WORKER_STATS:
+                    del self._stats[next(iter(self._stats))]
+            entry["tasks"] += 1
+            entry["total_task_ms"] += task_ms
+
+    def worker_stats(self):
+        # One entry per worker that has finished a task, with memory figures
+        # for the ones still running ("memory": None once recycled)
+        with self._lock:
+            entries = [dict(entry) for entry in self._stats.values()]
+        for entry in entries:
+            entry["mean_task_ms"] = entry["total_task_ms"] / entry["tasks"]
+            entry["memory"] = process_memory(entry["pid"])
+        return entries
+
+    def shutdown(self, wait=True, *, cancel_futures=False):
+        if self._broken is not None:
+            self._monitor.join()  # it terminates the pool itself
+            if wait:
+                self._pool.join()
+            return
+        if wait and not cancel_futures:
+            self._pool.close()
+            self._pool.join()
+            self._closing = True
+        else:
+            self._closing = True
+            self._pool.terminate()
+            # Terminated tasks never report back
+            self._fail_pending("the pool was shut down before the task finished")
+            if wait:
+                self._pool.join()
+        if wait:
+            self._monitor.join()
+
+
+def format_worker_stats(entries):
+    mib = 1 << 20
+    lines = [f"{'pid':>8} {'tasks':>6} {'ready ms':>9} {'first ms':>9} {'mean ms':>8} "
+             f"{'RSS MiB':>8} {'PSS MiB':>8} {'shared':>7} {'private':>8}"]
+    for e in sorted(entries, key=lambda e: e["pid"]):
+        memory = e["memory"]
+        if memory is None:
+            columns = f"{'-':>8} {'-':>8} {'-':>7} {'-':>8}"
+        else:
+            columns = (f"{memory['rss'] / mib:8.1f} {memory['pss'] / mib:8.1f} "
+                       f"{memory['shared'] / mib:7.1f} {memory['private'] / mib:8.1f}")
+        lines.append(f"{e['pid']:8d} {e['tasks']:6d} {e['ready_ms']:9.1f} {e['first_result_ms']:9.2f} "
+                     f"{e['mean_task_ms']:8.2f} {columns}")
+    return "\n".join(lines)
+
+
+def _sample_render(spec):
+    return len(encode_png(render_signature(spec)))
+
+
+def _sample_specs(count):
+    from effects import available_effects
+
+    fonts = list(FONT_PATHS)
+    effect_sets = [(), ("bold",), ("shadow", "underline"), tuple(available_effects())]
+    return [make_spec(f"Signature {i}", fonts[i % len(fonts)], 80, effects=effect_sets[i // len(fonts) % len(effect_sets)])
+            for i in range(count)]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare worker start-up and memory across pool modes.")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--jobs", type=int, default=200, help="renders per mode")
+    parser.add_argument("--max-tasks-per-child", type=int, default=None, help="recycle workers after N renders")
+    parser.add_argument("--modes", nargs="+", default=["spawn", "fork", "warm"], choices=["spawn", "fork", "warm"],
+                        help="spawn/fork: workers preload fonts themselves; warm: forked from a warmed parent")
+    parser.add_argument("--preload-sizes", type=int, nargs="+", default=[80])
+    args = parser.parse_args(argv)
+
+    if len(args.modes) > 1:
+        # Each mode runs in a fresh interpreter so the warm parent does not
+        # leak its loaded fonts into the other modes
+        for mode in args.modes:
+            subprocess.run([sys.executable, os.path.abspath(__file__), "--modes", mode] + _passthrough(args), check=True)
+        return 0
+
+    mode = args.modes[0]
+    if mode != "spawn" and "fork" not in multiprocessing.get_all_start_methods():
+        print(f"{mode}: fork is not available on this platform", file=sys.stderr)
+        return 1
+    print(_run_mode(mode, args.workers, args.max_tasks_per_child, tuple(args.preload_sizes), _sample_specs(args.jobs)))
+    print()
+    return 0
+
+
+def _passthrough(args):
+    out = ["--jobs", str(args.jobs), "--preload-sizes"] + [str(size) for size in args.preload_sizes]
+    if args.workers:
+        out += ["--workers", str(args.workers)]
+    if args.max_tasks_per_child:
+        out += ["--max-tasks-per-child", str(args.max_tasks_per_child)]
+    return out
+
+
+def _run_mode(mode, workers, max_tasks_per_child, sizes, specs):
+    def warm():
+        warm_render_path(sizes)
+
+    start = time.perf_counter()
+    pool = WarmPool(workers, max_tasks_per_child, warm=warm if mode == "warm" else None,
+                    initializer=None if mode == "warm" else warm_render_path, initargs=(sizes,),
+                    start_method="spawn" if mode == "spawn" else "fork")
+    try:
+        created = time.perf_counter()
+        first = [pool.submit(_sample_render, spec) for spec in specs[:pool.workers]]
+        for future in first:
+            future.result()
+        first_round = time.perf_counter()
+        for future in [pool.submit(_sample_render, spec) for spec in specs[pool.workers:]]:
+            future.result()
+        end = time.perf_counter()
+        entries = pool.worker_stats()
+    finally:
+        pool.shutdown()
+    live = [e["memory"] for e in entries if e["memory"]]
+    pss = sum(m["pss"] for m in live) / (1 << 20)
+    return (f"{mode}: parent warm-up {pool.warm_ms:.0f} ms, pool start {(created - start) * 1000:.0f} ms, "
+            f"first render on every worker {(first_round - start) * 1000:.0f} ms, "
+            f"{len(specs)} renders in {(end - start):.2f}s, live workers' PSS {pss:.1f} MiB\n"
+            + format_worker_stats(entries))
+
+
+if __name__ == "__main__":
+    sys.exit(main())